@@ -1,7 +1,7 @@
 import pygame
 from twenty.controller import GameController
 from twenty.user import User, HumanUser
-from twenty.training.train import train
+from twenty.training.ntuple import train_ntuple
 
 
 def main():
@@ -21,7 +21,7 @@ def main():
     controller.run()
     """
 
-    train()
+    train_ntuple(checkpoint_path='checkpoints/ntuple', resume=True)
 
 
 
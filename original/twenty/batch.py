@@ -0,0 +1,202 @@
+"""
+Vectorized 2048 simulator that steps many boards at once. Boards are stored
+as the log2 of the tile values in a single (N, 4, 4) uint8 array and every
+row is resolved through the lookup tables built by twenty.bitboard, so a
+step is a fixed number of NumPy operations no matter how many boards are
+being played.
+"""
+from typing import List, Optional, Tuple
+import numpy as np
+from twenty import bitboard
+from twenty.model import Direction
+
+
+def _build_tables():
+    """
+    Convert the bitboard row tables into NumPy arrays indexed by row key.
+    """
+    rows = np.arange(65536, dtype=np.int64)
+    shifts = np.arange(0, 16, 4, dtype=np.int64)
+
+    left = rows ^ np.array(bitboard.ROW_LEFT, dtype=np.int64)
+    right = rows ^ np.array(bitboard.ROW_RIGHT, dtype=np.int64)
+
+    row_left = ((left[:, None] >> shifts) & 0xF).astype(np.uint8)
+    score_left = np.array(bitboard.SCORE_LEFT, dtype=np.int64)
+    legal_left = left != rows
+    legal_right = right != rows
+    return row_left, score_left, legal_left, legal_right
+
+
+ROW_LEFT, SCORE_LEFT, LEGAL_LEFT, LEGAL_RIGHT = _build_tables()
+
+_KEY_SHIFTS = np.array([0, 4, 8, 12], dtype=np.int64)
+
+
+def row_keys(exponents: np.ndarray) -> np.ndarray:
+    """
+    Pack the last axis (4 exponents) of the array into 16 bit table keys.
+    """
+    return (exponents.astype(np.int64) << _KEY_SHIFTS).sum(axis=-1)
+
+
+def _to_left(boards: np.ndarray, direction: int) -> np.ndarray:
+    """
+    Orient the boards so the move in the given direction becomes a move to
+    the left.
+    """
+    if direction == Direction.UP.value:
+        return boards.transpose(0, 2, 1)
+    if direction == Direction.DOWN.value:
+        return boards.transpose(0, 2, 1)[:, :, ::-1]
+    if direction == Direction.RIGHT.value:
+        return boards[:, :, ::-1]
+    return boards
+
+
+def _from_left(boards: np.ndarray, direction: int) -> np.ndarray:
+    """
+    Undo the orientation applied by _to_left.
+    """
+    if direction == Direction.UP.value:
+        return boards.transpose(0, 2, 1)
+    if direction == Direction.DOWN.value:
+        return boards[:, :, ::-1].transpose(0, 2, 1)
+    if direction == Direction.RIGHT.value:
+        return boards[:, :, ::-1]
+    return boards
+
+
+def slide(boards: np.ndarray, directions: np.ndarray,
+          out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Slide every board in its own direction. Returns the new boards and the
+    score gained on each board. No tiles are spawned. The boards can be
+    slid in place by passing them as out.
+    """
+    result = boards.copy() if out is None else out
+    rewards = np.zeros(len(boards), dtype=np.int64)
+    for direction in range(4):
+        indices = np.flatnonzero(directions == direction)
+        if len(indices) == 0:
+            continue
+        keys = row_keys(_to_left(boards[indices], direction))
+        result[indices] = _from_left(ROW_LEFT[keys], direction)
+        rewards[indices] = SCORE_LEFT[keys].sum(axis=1)
+    return result, rewards
+
+
+def legal_moves(boards: np.ndarray) -> np.ndarray:
+    """
+    Return an (N, 4) boolean array that is true where moving the board in
+    that direction (indexed by Direction.value) changes it.
+    """
+    row = row_keys(boards)
+    col = row_keys(boards.transpose(0, 2, 1))
+    mask = np.empty((len(boards), 4), dtype=bool)
+    mask[:, Direction.UP.value] = LEGAL_LEFT[col].any(axis=1)
+    mask[:, Direction.DOWN.value] = LEGAL_RIGHT[col].any(axis=1)
+    mask[:, Direction.LEFT.value] = LEGAL_LEFT[row].any(axis=1)
+    mask[:, Direction.RIGHT.value] = LEGAL_RIGHT[row].any(axis=1)
+    return mask
+
+
+class BatchGameModel:
+    """
+    Holds N games in one (N, 4, 4) array of tile exponents and steps all of
+    them with a single call. Finished games are reset automatically so the
+    batch always contains N live games, unless auto_reset is turned off.
+    """
+    def __init__(self, num_boards: int, initial_state: Optional[List[List[int]]] = None,
+                 seed: Optional[int] = None, auto_reset: bool = True):
+        self.num_boards = num_boards
+        self.auto_reset = auto_reset
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((num_boards, 4, 4), dtype=np.uint8)
+        self.scores = np.zeros(num_boards, dtype=np.int64)
+        # Score of the last game that finished on each board
+        self.final_scores = np.zeros(num_boards, dtype=np.int64)
+
+        self.initial_board = None
+        if initial_state is not None:
+            tiles = np.array(initial_state, dtype=np.int64)
+            exponents = np.zeros((4, 4), dtype=np.uint8)
+            nonzero = tiles > 0
+            exponents[nonzero] = np.log2(tiles[nonzero]).astype(np.uint8)
+            self.initial_board = exponents
+
+        self.reset()
+
+    @property
+    def tiles(self) -> np.ndarray:
+        """
+        The boards as an (N, 4, 4) array of tile values.
+        """
+        return np.where(self.boards > 0, np.left_shift(1, self.boards, dtype=np.int32), 0)
+
+    def reset(self, indices: Optional[np.ndarray] = None):
+        """
+        Reset the given boards (all of them by default) to the initial state.
+        Without an initial state two random tiles are placed on an empty board.
+        """
+        if indices is None:
+            indices = np.arange(self.num_boards)
+        if len(indices) == 0:
+            return
+        self.scores[indices] = 0
+        if self.initial_board is not None:
+            self.boards[indices] = self.initial_board
+        else:
+            self.boards[indices] = 0
+            self.spawn(indices)
+            self.spawn(indices)
+
+    def spawn(self, indices: np.ndarray):
+        """
+        Add a random tile to each of the given boards. 90% chance of a 2,
+        10% chance of a 4, placed uniformly among the empty cells. Boards
+        without an empty cell are left untouched.
+        """
+        flat = self.boards[indices].reshape(len(indices), 16)
+        empty = flat == 0
+        has_empty = empty.any(axis=1)
+        # Giving every empty cell a random priority and taking the largest
+        # picks an empty cell uniformly at random.
+        priority = self.rng.random(empty.shape) * empty
+        cells = priority.argmax(axis=1)
+        values = np.where(self.rng.random(len(indices)) < 0.9, 1, 2).astype(np.uint8)
+
+        indices = indices[has_empty]
+        cells = cells[has_empty]
+        self.boards[indices, cells // 4, cells % 4] = values[has_empty]
+
+    def legal_moves(self) -> np.ndarray:
+        """
+        Return the (N, 4) mask of directions that change each board.
+        """
+        return legal_moves(self.boards)
+
+    def step(self, directions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Move every board in the matching direction and spawn a new tile on
+        each board the move changed, as GameModel.move does. Returns the reward (score gained), a flag telling
+        whether the game on that board ended, and the legal move mask of
+        the boards after the step. With auto_reset, finished boards are
+        reset before returning so the mask already refers to the new game.
+        Finished boards that are not reset stay unchanged on later steps.
+        """
+        directions = np.asarray(directions)
+        before = self.boards.copy()
+        _, rewards = slide(self.boards, directions, out=self.boards)
+        self.scores += rewards
+        changed = (self.boards != before).reshape(self.num_boards, 16).any(axis=1)
+        self.spawn(np.flatnonzero(changed))
+
+        mask = self.legal_moves()
+        dones = ~mask.any(axis=1)
+        finished = np.flatnonzero(dones)
+        self.final_scores[finished] = self.scores[finished]
+        if self.auto_reset and len(finished) > 0:
+            self.reset(finished)
+            mask[finished] = legal_moves(self.boards[finished])
+        return rewards, dones, mask
@@ -0,0 +1,280 @@
+"""
+Microbenchmarks and randomized equivalence checks for the 2048 engines.
+
+    python -m twenty.benchmark --output results.json
+    python -m twenty.benchmark --check-only
+
+The equivalence checks play random boards through every faster engine and
+compare the result, score and legal moves against the reference
+GameModel.move_* implementations. The benchmarks are only run when every
+check passes, and their results are written as JSON so runs can be
+compared.
+"""
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Callable, Dict, List
+import json
+import platform
+import random
+import sys
+import numpy as np
+from twenty import batch, bitboard
+from twenty.bitboard import BitboardModel
+from twenty.model import GameModel, Direction
+
+
+REFERENCE_MOVES = {
+    Direction.UP: GameModel.move_up,
+    Direction.DOWN: GameModel.move_down,
+    Direction.LEFT: GameModel.move_left,
+    Direction.RIGHT: GameModel.move_right,
+}
+
+
+def random_board(rng: random.Random, max_exponent: int = 11, fill: float = 0.7) -> List[List[int]]:
+    """
+    Return a random 4x4 board of tile values where every cell is filled
+    with the given probability.
+    """
+    return [[(1 << rng.randint(1, max_exponent)) if rng.random() < fill else 0 for _ in range(4)]
+            for _ in range(4)]
+
+
+def to_exponents(tiles) -> np.ndarray:
+    tiles = np.asarray(tiles)
+    exponents = np.zeros(tiles.shape, dtype=np.uint8)
+    nonzero = tiles > 0
+    exponents[nonzero] = np.log2(tiles[nonzero]).astype(np.uint8)
+    return exponents
+
+
+def check_equivalence(num_boards: int = 10000, seed: int = 0) -> List[str]:
+    """
+    Compare the bitboard and batch engines against the reference moves on
+    random boards. Returns a description of every mismatch found.
+    """
+    rng = random.Random(seed)
+    failures = []
+    boards = []
+    expected = []
+    for _ in range(num_boards):
+        # Mix sparse and dense boards and small tiles so merges are common
+        tiles = random_board(rng, rng.choice([3, 6, 11]), rng.choice([0.3, 0.7, 1.0]))
+        boards.append(tiles)
+
+        reference_mask = 0
+        results = []
+        for direction in Direction:
+            model = GameModel(tiles)
+            REFERENCE_MOVES[direction](model)
+            results.append((model.tiles, model.score))
+            if (model.tiles != np.array(tiles)).any():
+                reference_mask |= 1 << direction.value
+        expected.append(results)
+
+        if GameModel(tiles).legal_moves() != reference_mask:
+            failures.append('GameModel.legal_moves {} on {}'.format(GameModel(tiles).legal_moves(), tiles))
+
+        packed = bitboard.pack(tiles)
+        if bitboard.legal_moves(packed) != reference_mask:
+            failures.append('bitboard.legal_moves {} on {}'.format(bitboard.legal_moves(packed), tiles))
+        for direction in Direction:
+            board, score = bitboard.move_board(packed, direction)
+            reference_tiles, reference_score = results[direction.value]
+            if (bitboard.unpack(board) != reference_tiles).any() or score != reference_score:
+                failures.append('bitboard {} on {}'.format(direction.name, tiles))
+
+        # A direction that changes nothing must leave the board as it was,
+        # without spawning a tile, even on a full board
+        for direction in Direction:
+            if reference_mask & (1 << direction.value):
+                continue
+            for model_type in (GameModel, BitboardModel):
+                moved = model_type(tiles).move(direction)
+                if (np.asarray(moved.tiles) != np.array(tiles)).any():
+                    failures.append('{}.move {} on {}'.format(model_type.__name__, direction.name, tiles))
+
+    exponents = to_exponents(boards)
+    mask = batch.legal_moves(exponents)
+    for direction in Direction:
+        directions = np.full(num_boards, direction.value)
+        slid, scores = batch.slide(exponents, directions)
+        for i in range(num_boards):
+            reference_tiles, reference_score = expected[i][direction.value]
+            if (to_exponents(reference_tiles) != slid[i]).any() or scores[i] != reference_score:
+                failures.append('batch {} on {}'.format(direction.name, boards[i]))
+            if mask[i, direction.value] != bool((slid[i] != exponents[i]).any()):
+                failures.append('batch.legal_moves {} on {}'.format(direction.name, boards[i]))
+
+        # A step is the slide plus one new 2 or 4 on an empty cell, and
+        # only on the boards the slide changed
+        model = batch.BatchGameModel(num_boards, seed=seed, auto_reset=False)
+        model.boards[:] = exponents
+        model.scores[:] = 0
+        rewards, _, _ = model.step(directions)
+        added = (model.boards != slid).reshape(num_boards, 16)
+        for i in range(num_boards):
+            new_cells = np.flatnonzero(added[i])
+            if mask[i, direction.value]:
+                spawned = len(new_cells) == 1 and slid[i].flat[new_cells[0]] == 0 and \
+                    model.boards[i].flat[new_cells[0]] in (1, 2)
+            else:
+                spawned = len(new_cells) == 0
+            if not spawned or rewards[i] != scores[i]:
+                failures.append('BatchGameModel.step {} on {}'.format(direction.name, boards[i]))
+    return failures
+
+
+def rate(function: Callable[[], None], repeat: int) -> float:
+    """
+    Call the function repeat times and return the calls per second.
+    """
+    start = perf_counter()
+    for _ in range(repeat):
+        function()
+    return repeat / (perf_counter() - start)
+
+
+def benchmark_moves(boards: List[List[List[int]]]) -> Dict[str, Dict[str, float]]:
+    """
+    Moves per second for every direction and engine.
+    """
+    results = {'reference': dict(), 'bitboard': dict(), 'batch': dict()}
+    packed = [bitboard.pack(tiles) for tiles in boards]
+    exponents = to_exponents(boards)
+    models = [GameModel(tiles) for tiles in boards]
+
+    for direction in Direction:
+        move = REFERENCE_MOVES[direction]
+
+        def reference():
+            for tiles, model in zip(boards, models):
+                model.tiles[:] = tiles
+                move(model)
+
+        def packed_moves():
+            for board in packed:
+                bitboard.MOVES[direction.value](board)
+
+        directions = np.full(len(boards), direction.value)
+
+        def batched():
+            batch.slide(exponents, directions)
+
+        results['reference'][direction.name] = rate(reference, 5) * len(boards)
+        results['bitboard'][direction.name] = rate(packed_moves, 20) * len(boards)
+        results['batch'][direction.name] = rate(batched, 20) * len(boards)
+    return results
+
+
+def benchmark_queries(boards: List[List[List[int]]]) -> Dict[str, Dict[str, float]]:
+    """
+    Calls per second of the board queries for every engine.
+    """
+    results = dict()
+    for name, model_type in (('reference', GameModel), ('bitboard', BitboardModel)):
+        models = [model_type(tiles) for tiles in boards]
+
+        def game_over():
+            for model in models:
+                # Drop the cached mask so the query is measured, not the cache
+                model._legal_moves_key = None
+                model._legal_moves_board = None
+                model.game_over()
+
+        def get_empty_positions():
+            for model in models:
+                model.get_empty_positions()
+
+        results[name] = {
+            'game_over': rate(game_over, 5) * len(models),
+            'get_empty_positions': rate(get_empty_positions, 5) * len(models),
+        }
+    return results
+
+
+def play_random_game(model, rng: random.Random):
+    """
+    Play random legal moves until the game is over. Returns the final model.
+    """
+    directions = list(Direction)
+    while not model.game_over():
+        mask = model.legal_moves()
+        legal = [direction for direction in directions if mask & (1 << direction.value)]
+        model = model.move(rng.choice(legal))
+    return model
+
+
+def benchmark_games(num_games: int, seed: int) -> Dict[str, float]:
+    """
+    Full random play games per second for every engine.
+    """
+    initial_tiles = [
+        [2, 0, 0, 0],
+        [0, 0, 0, 0],
+        [0, 0, 0, 0],
+        [0, 0, 0, 2]
+    ]
+    results = dict()
+    for name, model_type in (('reference', GameModel), ('bitboard', BitboardModel)):
+        rng = random.Random(seed)
+        spawn_rng = np.random.default_rng(seed)
+        results[name] = rate(lambda: play_random_game(model_type(initial_tiles, rng=spawn_rng), rng), num_games)
+
+    # The batch engine plays num_games boards at once with random directions
+    model = batch.BatchGameModel(num_games, initial_tiles, seed=seed, auto_reset=False)
+    rng = np.random.default_rng(seed)
+    start = perf_counter()
+    finished = np.zeros(num_games, dtype=bool)
+    while not finished.all():
+        _, dones, _ = model.step(rng.integers(0, 4, num_games))
+        finished |= dones
+    results['batch'] = num_games / (perf_counter() - start)
+    return results
+
+
+def run_benchmarks(num_boards: int = 2000, num_games: int = 20, seed: int = 0) -> Dict:
+    rng = random.Random(seed)
+    boards = [random_board(rng) for _ in range(num_boards)]
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'num_boards': num_boards,
+        'num_games': num_games,
+        'seed': seed,
+        'moves_per_second': benchmark_moves(boards),
+        'queries_per_second': benchmark_queries(boards),
+        'games_per_second': benchmark_games(num_games, seed),
+    }
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark and cross check the 2048 engines.')
+    parser.add_argument('--output', default='benchmark.json', help='Where to write the JSON results')
+    parser.add_argument('--boards', type=int, default=2000, help='Number of random boards per benchmark')
+    parser.add_argument('--games', type=int, default=20, help='Number of random play games per engine')
+    parser.add_argument('--check-boards', type=int, default=10000, help='Number of boards to cross check')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--check-only', action='store_true', help='Only run the equivalence checks')
+    args = parser.parse_args()
+
+    failures = check_equivalence(args.check_boards, args.seed)
+    for failure in failures[:20]:
+        print('Mismatch: ' + failure)
+    if len(failures) > 0:
+        print('{} mismatches found'.format(len(failures)))
+        sys.exit(1)
+    print('All engines match the reference on {} boards'.format(args.check_boards))
+    if args.check_only:
+        return
+
+    results = run_benchmarks(args.boards, args.games, args.seed)
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
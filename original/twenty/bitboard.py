@@ -0,0 +1,297 @@
+"""
+Bitboard implementation of the 2048 game. The whole board is packed into a
+single 64 bit integer where every cell takes 4 bits and stores the log2 of
+the tile value (0 for an empty cell). Cell (x, y) lives at nibble 4 * x + y,
+so every row is a 16 bit chunk of the board.
+
+Every possible row is slid once when the module is imported and the results
+are kept in 65,536 entry lookup tables, so a move is a handful of table
+lookups instead of a walk over the board. The rows are slid with the same
+rules as GameModel.move_left/move_right so both engines agree on the
+resulting board and score.
+"""
+from typing import List, Optional, Tuple, Union
+import numpy as np
+from twenty.model import Direction
+
+
+ROW_MASK = 0xFFFF
+
+# The largest exponent that fits in a nibble. Tiles of 32768 are never merged.
+MAX_EXPONENT = 15
+
+
+def _slide_row_left(cells: List[int]) -> Tuple[List[int], int]:
+    """
+    Slide a row of exponents to the left following the rules of
+    GameModel.move_left. Returns the new row and the score gained.
+    """
+    cells = list(cells)
+    score = 0
+    for y in range(4):
+        if cells[y] == 0:
+            continue
+
+        # Move the tile left as far as possible
+        while y > 0 and cells[y - 1] == 0:
+            cells[y - 1] = cells[y]
+            cells[y] = 0
+            y -= 1
+
+        # Combine the tile with the one to the left
+        if y > 0 and cells[y - 1] == cells[y] and cells[y] < MAX_EXPONENT:
+            cells[y - 1] += 1
+            cells[y] = 0
+            score += 1 << cells[y - 1]
+    return cells, score
+
+
+def _pack_row(cells: List[int]) -> int:
+    return cells[0] | (cells[1] << 4) | (cells[2] << 8) | (cells[3] << 12)
+
+
+def _unpack_row(row: int) -> List[int]:
+    return [(row >> (4 * y)) & 0xF for y in range(4)]
+
+
+def _reverse_row(row: int) -> int:
+    return ((row >> 12) & 0xF) | ((row >> 4) & 0xF0) | ((row << 4) & 0xF00) | ((row << 12) & 0xF000)
+
+
+def _unpack_col(row: int) -> int:
+    """
+    Spread a 16 bit row out over the first column of the board.
+    """
+    return (row & 0xF) | ((row & 0xF0) << 12) | ((row & 0xF00) << 24) | ((row & 0xF000) << 36)
+
+
+def _build_tables():
+    """
+    Precompute the result of sliding every possible row. The move tables
+    store the XOR between the old and new row so applying a move is a
+    single XOR per row.
+    """
+    row_left = [0] * 65536
+    row_right = [0] * 65536
+    col_up = [0] * 65536
+    col_down = [0] * 65536
+    score_left = [0] * 65536
+    score_right = [0] * 65536
+
+    for row in range(65536):
+        cells, score = _slide_row_left(_unpack_row(row))
+        result = _pack_row(cells)
+        reversed_row = _reverse_row(row)
+        reversed_result = _reverse_row(result)
+
+        row_left[row] = row ^ result
+        row_right[reversed_row] = reversed_row ^ reversed_result
+        col_up[row] = _unpack_col(row) ^ _unpack_col(result)
+        col_down[reversed_row] = _unpack_col(reversed_row) ^ _unpack_col(reversed_result)
+        score_left[row] = score
+        score_right[reversed_row] = score
+
+    return row_left, row_right, col_up, col_down, score_left, score_right
+
+
+ROW_LEFT, ROW_RIGHT, COL_UP, COL_DOWN, SCORE_LEFT, SCORE_RIGHT = _build_tables()
+
+
+def transpose(board: int) -> int:
+    """
+    Transpose the board so the columns become rows.
+    """
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def move_up(board: int) -> Tuple[int, int]:
+    t = transpose(board)
+    c0 = t & ROW_MASK
+    c1 = (t >> 16) & ROW_MASK
+    c2 = (t >> 32) & ROW_MASK
+    c3 = t >> 48
+    board ^= COL_UP[c0] ^ (COL_UP[c1] << 4) ^ (COL_UP[c2] << 8) ^ (COL_UP[c3] << 12)
+    return board, SCORE_LEFT[c0] + SCORE_LEFT[c1] + SCORE_LEFT[c2] + SCORE_LEFT[c3]
+
+
+def move_down(board: int) -> Tuple[int, int]:
+    t = transpose(board)
+    c0 = t & ROW_MASK
+    c1 = (t >> 16) & ROW_MASK
+    c2 = (t >> 32) & ROW_MASK
+    c3 = t >> 48
+    board ^= COL_DOWN[c0] ^ (COL_DOWN[c1] << 4) ^ (COL_DOWN[c2] << 8) ^ (COL_DOWN[c3] << 12)
+    return board, SCORE_RIGHT[c0] + SCORE_RIGHT[c1] + SCORE_RIGHT[c2] + SCORE_RIGHT[c3]
+
+
+def move_left(board: int) -> Tuple[int, int]:
+    r0 = board & ROW_MASK
+    r1 = (board >> 16) & ROW_MASK
+    r2 = (board >> 32) & ROW_MASK
+    r3 = board >> 48
+    board ^= ROW_LEFT[r0] ^ (ROW_LEFT[r1] << 16) ^ (ROW_LEFT[r2] << 32) ^ (ROW_LEFT[r3] << 48)
+    return board, SCORE_LEFT[r0] + SCORE_LEFT[r1] + SCORE_LEFT[r2] + SCORE_LEFT[r3]
+
+
+def move_right(board: int) -> Tuple[int, int]:
+    r0 = board & ROW_MASK
+    r1 = (board >> 16) & ROW_MASK
+    r2 = (board >> 32) & ROW_MASK
+    r3 = board >> 48
+    board ^= ROW_RIGHT[r0] ^ (ROW_RIGHT[r1] << 16) ^ (ROW_RIGHT[r2] << 32) ^ (ROW_RIGHT[r3] << 48)
+    return board, SCORE_RIGHT[r0] + SCORE_RIGHT[r1] + SCORE_RIGHT[r2] + SCORE_RIGHT[r3]
+
+
+# Indexed by Direction.value
+MOVES = [move_up, move_down, move_left, move_right]
+
+
+def move_board(board: int, direction: Direction) -> Tuple[int, int]:
+    """
+    Slide the board in the given direction. Returns the new board and the
+    score gained by the merges. No tile is added.
+    """
+    return MOVES[direction.value](board)
+
+
+def legal_moves(board: int) -> int:
+    """
+    Return a 4 bit mask of the directions that change the board, where bit
+    Direction.value is set when moving in that direction is legal.
+    """
+    t = transpose(board)
+    mask = 0
+    if COL_UP[t & ROW_MASK] or COL_UP[(t >> 16) & ROW_MASK] or COL_UP[(t >> 32) & ROW_MASK] or COL_UP[t >> 48]:
+        mask |= 1
+    if (COL_DOWN[t & ROW_MASK] or COL_DOWN[(t >> 16) & ROW_MASK] or COL_DOWN[(t >> 32) & ROW_MASK]
+            or COL_DOWN[t >> 48]):
+        mask |= 2
+    if (ROW_LEFT[board & ROW_MASK] or ROW_LEFT[(board >> 16) & ROW_MASK] or ROW_LEFT[(board >> 32) & ROW_MASK]
+            or ROW_LEFT[board >> 48]):
+        mask |= 4
+    if (ROW_RIGHT[board & ROW_MASK] or ROW_RIGHT[(board >> 16) & ROW_MASK] or ROW_RIGHT[(board >> 32) & ROW_MASK]
+            or ROW_RIGHT[board >> 48]):
+        mask |= 8
+    return mask
+
+
+def count_empty(board: int) -> int:
+    """
+    Return the number of empty cells on the board.
+    """
+    # Collapse every nibble down to a single bit that is set when the
+    # nibble is non-zero, then count the bits.
+    board |= (board >> 2) & 0x3333333333333333
+    board |= board >> 1
+    board &= 0x1111111111111111
+    return 16 - bin(board).count('1')
+
+
+def pack(tiles) -> int:
+    """
+    Pack a 4x4 grid of tile values into a bitboard.
+    """
+    board = 0
+    for x in range(4):
+        for y in range(4):
+            value = int(tiles[x][y])
+            if value != 0:
+                board |= (value.bit_length() - 1) << (4 * (4 * x + y))
+    return board
+
+
+def unpack(board: int) -> np.ndarray:
+    """
+    Unpack a bitboard into a 4x4 array of tile values.
+    """
+    tiles = np.zeros((4, 4), dtype=np.int32)
+    for x in range(4):
+        for y in range(4):
+            exponent = (board >> (4 * (4 * x + y))) & 0xF
+            if exponent != 0:
+                tiles[x][y] = 1 << exponent
+    return tiles
+
+
+class BitboardModel:
+    """
+    Drop in replacement for GameModel backed by a packed 64 bit board. Moves
+    are resolved through the precomputed row and column tables.
+    """
+    def __init__(self, tiles: Union[List[List[int]], int], score: int = 0,
+                 rng: Optional[np.random.Generator] = None):
+        if isinstance(tiles, int):
+            self.board = tiles
+        else:
+            self.board = pack(tiles)
+        self.score = score
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        # Legal move mask and the board it was computed for
+        self._legal_moves_board = None
+        self._legal_moves = 0
+
+    @property
+    def tiles(self) -> np.ndarray:
+        """
+        The board as a 4x4 array of tile values, matching GameModel.tiles.
+        """
+        return unpack(self.board)
+
+    def game_over(self) -> bool:
+        """
+        Return true when no move in any direction changes the board.
+        """
+        return self.legal_moves() == 0
+
+    def legal_moves(self) -> int:
+        """
+        Return a 4 bit mask of the directions that change the board. The
+        mask is cached until the board changes.
+        """
+        if self.board != self._legal_moves_board:
+            self._legal_moves = legal_moves(self.board)
+            self._legal_moves_board = self.board
+        return self._legal_moves
+
+    def get_empty_positions(self) -> List[Tuple[int, int]]:
+        """
+        Return a list of (x, y) positions that are empty.
+        """
+        board = self.board
+        return [(i >> 2, i & 3) for i in range(16) if (board >> (4 * i)) & 0xF == 0]
+
+    def add_tile(self):
+        """
+        Randomly add a tile to the board. 90% chance of a 2, 10% chance of a 4.
+        The tile is placed randomly in a position that is currently empty.
+        """
+        empty_positions = self.get_empty_positions()
+        if len(empty_positions) == 0:
+            raise ValueError('No empty positions')
+
+        x, y = empty_positions[self.rng.integers(len(empty_positions))]
+        exponent = 1 if self.rng.random() < 0.9 else 2
+        self.board |= exponent << (4 * (4 * x + y))
+
+    def move(self, direction: Direction):
+        """
+        Make a move in the given direction, returning a new BitboardModel.
+        After the move takes place, a new tile is added to the board. A move
+        that does not change the board adds no tile.
+        """
+        board, score = MOVES[direction.value](self.board)
+        new_model = BitboardModel(board, self.score + score, self.rng)
+        if board != self.board:
+            new_model.add_tile()
+        return new_model
+
+    def __repr__(self):
+        return str(self.tiles)
@@ -2,16 +2,37 @@ from twenty.user import User
 from twenty.view import GameView
 from twenty.model import GameModel
 import pygame
-from typing import List
+from typing import List, Optional
+import numpy as np
 
 
 class GameController:
-    def __init__(self, initial_state: List[List[int]], user: User):
-        self.model = GameModel(initial_state)
+    def __init__(self, initial_state: List[List[int]], user: User, model_type=GameModel,
+                 display: bool = True, seed: Optional[int] = None, max_fps: Optional[int] = None):
+        # The seed and the moves are enough to replay the game with
+        # twenty.model.replay, so without a seed a fresh one is drawn and kept
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
 
-        screen = pygame.display.set_mode((400, 400))
-        pygame.init()
-        self.view = GameView(screen, self.model)
+        # model_type can be any engine with the GameModel interface, such as
+        # twenty.bitboard.BitboardModel
+        self.model = model_type(initial_state, rng=np.random.default_rng(seed))
+        self.moves = []
+
+        # Without a display the game runs headless, for automated players
+        self.display = display
+        self.view = None
+        # Auto-play mode: with max_fps set the frame rate is capped and the
+        # window events are handled between moves, for automated users
+        self.max_fps = max_fps
+        self.clock = None
+        if self.display:
+            screen = pygame.display.set_mode((400, 400))
+            pygame.init()
+            self.view = GameView(screen, self.model)
+            if self.max_fps is not None:
+                self.clock = pygame.time.Clock()
 
         self.user = user
 
@@ -20,9 +41,17 @@ class GameController:
         Run the game.
         """
         while not self.model.game_over():
-            self.view.draw()
-            direction = self.user.move()
+            if self.display:
+                self.view.draw()
+            direction = self.user.move(self.model)
             self.model = self.model.move(direction)
-            self.view.update(self.model)
+            self.moves.append(direction)
+            if self.display:
+                self.view.update(self.model)
+            if self.clock is not None:
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        exit()
+                self.clock.tick(self.max_fps)
 
         print('Game Over')
@@ -0,0 +1,82 @@
+"""
+Board evaluation functions used by the search based players. Every heuristic
+is a callable taking a packed board (see twenty.bitboard) and returning a
+float where larger is better.
+"""
+from twenty import bitboard
+
+
+def empty_cells(board: int) -> float:
+    """
+    Score a board by the number of empty cells left on it.
+    """
+    return float(bitboard.count_empty(board))
+
+
+class RowHeuristic:
+    """
+    Scores a board by summing a per row score over every row and column.
+    The per row score rewards empty cells, adjacent equal tiles and
+    monotonic rows while penalizing large tiles away from the edges. The
+    score of every possible row is precomputed so evaluating a board costs
+    eight table lookups.
+    """
+    def __init__(self, lost_penalty: float = 200000.0, empty_weight: float = 270.0,
+                 merges_weight: float = 700.0, monotonicity_weight: float = 47.0,
+                 monotonicity_power: float = 4.0, sum_weight: float = 11.0,
+                 sum_power: float = 3.5):
+        self.lost_penalty = lost_penalty
+        self.empty_weight = empty_weight
+        self.merges_weight = merges_weight
+        self.monotonicity_weight = monotonicity_weight
+        self.monotonicity_power = monotonicity_power
+        self.sum_weight = sum_weight
+        self.sum_power = sum_power
+        self.table = [self.score_row(row) for row in range(65536)]
+
+    def score_row(self, row: int) -> float:
+        """
+        Score a single 16 bit row of exponents.
+        """
+        cells = [(row >> (4 * y)) & 0xF for y in range(4)]
+
+        total = 0.0
+        empty = 0
+        merges = 0
+        previous = 0
+        counter = 0
+        for exponent in cells:
+            total += exponent ** self.sum_power
+            if exponent == 0:
+                empty += 1
+                continue
+            if previous == exponent:
+                counter += 1
+            elif counter > 0:
+                merges += 1 + counter
+                counter = 0
+            previous = exponent
+        if counter > 0:
+            merges += 1 + counter
+
+        monotonicity_left = 0.0
+        monotonicity_right = 0.0
+        for y in range(1, 4):
+            left = cells[y - 1] ** self.monotonicity_power
+            right = cells[y] ** self.monotonicity_power
+            if cells[y - 1] > cells[y]:
+                monotonicity_left += left - right
+            else:
+                monotonicity_right += right - left
+
+        return (self.lost_penalty + self.empty_weight * empty + self.merges_weight * merges
+                - self.monotonicity_weight * min(monotonicity_left, monotonicity_right)
+                - self.sum_weight * total)
+
+    def __call__(self, board: int) -> float:
+        table = self.table
+        t = bitboard.transpose(board)
+        return (table[board & 0xFFFF] + table[(board >> 16) & 0xFFFF]
+                + table[(board >> 32) & 0xFFFF] + table[board >> 48]
+                + table[t & 0xFFFF] + table[(t >> 16) & 0xFFFF]
+                + table[(t >> 32) & 0xFFFF] + table[t >> 48])
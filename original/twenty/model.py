@@ -1,7 +1,5 @@
 from enum import Enum
-from typing import List, Tuple
-import copy
-import random
+from typing import List, Optional, Tuple
 import numpy as np
 
 
@@ -17,19 +15,61 @@ class GameModel:
     Representation of the game at a given step. Handles storing the state of
     the game and also provides the functionality for updating the state
     """
-    def __init__(self, tiles: List[List[int]], score: int = 0):
+    def __init__(self, tiles: List[List[int]], score: int = 0, rng: Optional[np.random.Generator] = None):
         self.tiles = np.array(tiles, dtype=np.int32)
         self.score = score
 
+        # Random stream used for spawning tiles. It is owned by the game and
+        # handed on to every model the game moves through.
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        # Whether the last call to slide moved any tile
+        self.changed = False
+
+        # Undo stack. Board snapshots are written into a preallocated buffer
+        # that only grows when the stack gets deeper than ever before.
+        self._undo_tiles = np.empty((8, 4, 4), dtype=np.int32)
+        self._undo_scores = []
+
+        # Legal move mask and the board it was computed for
+        self._legal_moves_key = None
+        self._legal_moves = 0
+
     def game_over(self) -> bool:
         """
-        Return true when no additional tiles can be added to the board.
+        Return true when no move in any direction changes the board.
         """
-        for row in self.tiles:
-            for tile in row:
-                if tile == 0:
-                    return False
-        return True
+        return self.legal_moves() == 0
+
+    def legal_moves(self) -> int:
+        """
+        Return a 4 bit mask of the directions that change the board, where
+        bit Direction.value is set when moving in that direction is legal.
+        The mask is cached until the tiles change.
+        """
+        key = self.tiles.tobytes()
+        if key == self._legal_moves_key:
+            return self._legal_moves
+
+        tiles = self.tiles
+        occupied = tiles != 0
+        # A tile can slide towards an empty neighbour or merge with an equal
+        # one; either makes the move change the board.
+        horizontal_merge = ((tiles[:, :-1] == tiles[:, 1:]) & occupied[:, 1:]).any()
+        vertical_merge = ((tiles[:-1, :] == tiles[1:, :]) & occupied[1:, :]).any()
+        mask = 0
+        if vertical_merge or (~occupied[:-1, :] & occupied[1:, :]).any():
+            mask |= 1 << Direction.UP.value
+        if vertical_merge or (occupied[:-1, :] & ~occupied[1:, :]).any():
+            mask |= 1 << Direction.DOWN.value
+        if horizontal_merge or (~occupied[:, :-1] & occupied[:, 1:]).any():
+            mask |= 1 << Direction.LEFT.value
+        if horizontal_merge or (occupied[:, :-1] & ~occupied[:, 1:]).any():
+            mask |= 1 << Direction.RIGHT.value
+
+        self._legal_moves_key = key
+        self._legal_moves = mask
+        return mask
 
     def get_empty_positions(self) -> List[Tuple[int, int]]:
         """
@@ -45,34 +85,81 @@ class GameModel:
     def add_tile(self):
         """
         Randomly add a tile to the board. 90% chance of a 2, 10% chance of a 4.
-        The tile is places randomly in a position that is currently empty.
+        The tile is placed randomly in a position that is currently empty.
         """
         empty_positions = self.get_empty_positions()
         if len(empty_positions) == 0:
-            throw("No empt<tf_agents.networks.q_network.QNetwork object at 0x7feb69ee40d0>: Inconsistent dtypes or shapes between `inputs` and `input_tensor_spec`y positions")
+            raise ValueError('No empty positions')
 
-        x, y = random.choice(empty_positions)
-        self.tiles[x][y] = 2 if random.random() < 0.9 else 4
+        x, y = empty_positions[self.rng.integers(len(empty_positions))]
+        self.tiles[x][y] = 2 if self.rng.random() < 0.9 else 4
 
     def move(self, direction: Direction):
         """
         Make a move in the given direction, returning a new GameModel.
-        After the move takes place, a new tile is added to the board.
+        After the move takes place, a new tile is added to the board. A move
+        that does not change the board adds no tile.
+        """
+        new_model = GameModel(self.tiles, self.score, self.rng)
+        new_model._slide(direction)
+        if (new_model.tiles != self.tiles).any():
+            new_model.add_tile()
+        return new_model
+
+    def slide(self, direction: Direction) -> bool:
+        """
+        Slide the tiles in the given direction in place without adding a new
+        tile. The previous state is pushed onto the undo stack. Returns
+        whether any tile moved, which is also stored in self.changed.
+        """
+        snapshot = self._push_undo()
+        self._slide(direction)
+        self.changed = bool((self.tiles != snapshot).any())
+        return self.changed
+
+    def spawn(self, position: Tuple[int, int], value: int):
+        """
+        Place a tile of the given value at an empty (x, y) position in place.
+        The previous state is pushed onto the undo stack.
         """
-        new_model = GameModel(copy.deepcopy(self.tiles))
-        new_model.score = self.score
+        x, y = position
+        if self.tiles[x][y] != 0:
+            raise ValueError('Position {} is not empty'.format(position))
+        self._push_undo()
+        self.tiles[x][y] = value
 
+    def undo(self):
+        """
+        Revert the last slide or spawn.
+        """
+        if len(self._undo_scores) == 0:
+            raise IndexError('Nothing to undo')
+        self.score = self._undo_scores.pop()
+        self.tiles[:] = self._undo_tiles[len(self._undo_scores)]
+
+    def _push_undo(self) -> np.ndarray:
+        """
+        Save the current state on the undo stack and return the snapshot.
+        """
+        depth = len(self._undo_scores)
+        if depth == len(self._undo_tiles):
+            grown = np.empty((2 * depth, 4, 4), dtype=np.int32)
+            grown[:depth] = self._undo_tiles
+            self._undo_tiles = grown
+        snapshot = self._undo_tiles[depth]
+        snapshot[:] = self.tiles
+        self._undo_scores.append(self.score)
+        return snapshot
+
+    def _slide(self, direction: Direction):
         if direction == Direction.UP:
-            new_model.move_up()
+            self.move_up()
         elif direction == Direction.DOWN:
-            new_model.move_down()
+            self.move_down()
         elif direction == Direction.LEFT:
-            new_model.move_left()
+            self.move_left()
         elif direction == Direction.RIGHT:
-            new_model.move_right()
-
-        new_model.add_tile()
-        return new_model
+            self.move_right()
 
     def move_up(self):
         """
@@ -83,17 +170,19 @@ class GameModel:
                 if self.tiles[x][y] == 0:
                     continue
 
-                # Move the tile up as far as possible
-                while x > 0 and self.tiles[x - 1][y] == 0:
-                    self.tiles[x - 1][y] = self.tiles[x][y]
-                    self.tiles[x][y] = 0
-                    x -= 1
+                # Move the tile up as far as possible. A separate cursor is
+                # used so the rest of the row is still read from row x.
+                row = x
+                while row > 0 and self.tiles[row - 1][y] == 0:
+                    self.tiles[row - 1][y] = self.tiles[row][y]
+                    self.tiles[row][y] = 0
+                    row -= 1
 
                 # Combine the tile with the one above it
-                if x > 0 and self.tiles[x - 1][y] == self.tiles[x][y]:
-                    self.tiles[x - 1][y] *= 2
-                    self.tiles[x][y] = 0
-                    self.score += self.tiles[x - 1][y]
+                if row > 0 and self.tiles[row - 1][y] == self.tiles[row][y]:
+                    self.tiles[row - 1][y] *= 2
+                    self.tiles[row][y] = 0
+                    self.score += self.tiles[row - 1][y]
 
 
     def move_down(self):
@@ -105,17 +194,19 @@ class GameModel:
                 if self.tiles[x][y] == 0:
                     continue
 
-                # Move the tile down as far as possible
-                while x < 3 and self.tiles[x + 1][y] == 0:
-                    self.tiles[x + 1][y] = self.tiles[x][y]
-                    self.tiles[x][y] = 0
-                    x += 1
+                # Move the tile down as far as possible. A separate cursor is
+                # used so the rest of the row is still read from row x.
+                row = x
+                while row < 3 and self.tiles[row + 1][y] == 0:
+                    self.tiles[row + 1][y] = self.tiles[row][y]
+                    self.tiles[row][y] = 0
+                    row += 1
 
                 # Combine the tile with the one below it
-                if x < 3 and self.tiles[x + 1][y] == self.tiles[x][y]:
-                    self.tiles[x + 1][y] *= 2
-                    self.tiles[x][y] = 0
-                    self.score += self.tiles[x + 1][y]
+                if row < 3 and self.tiles[row + 1][y] == self.tiles[row][y]:
+                    self.tiles[row + 1][y] *= 2
+                    self.tiles[row][y] = 0
+                    self.score += self.tiles[row + 1][y]
 
     def move_left(self):
         """
@@ -161,3 +252,14 @@ class GameModel:
 
     def __repr__(self):
         return str(self.tiles)
+
+
+def replay(initial_tiles: List[List[int]], seed: int, moves: List[Direction], model_type=GameModel):
+    """
+    Replay a game from its initial board, the seed of its random stream and
+    its list of moves. Returns the final model.
+    """
+    model = model_type(initial_tiles, rng=np.random.default_rng(seed))
+    for direction in moves:
+        model = model.move(direction)
+    return model
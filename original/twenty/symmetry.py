@@ -0,0 +1,150 @@
+"""
+Dihedral symmetries of the 4x4 board. The 8 rotations and reflections of a
+board are strategically identical, so a board can be replaced by a canonical
+representative (the smallest packed board among its 8 transforms) when
+caching search results or building datasets.
+
+Transforms are numbered 0 to 7. Bit 0 mirrors the board left to right, bit 1
+mirrors it top to bottom and bit 2 transposes it, applied in that order.
+"""
+from typing import List, Tuple, Union
+import numpy as np
+from twenty import bitboard
+from twenty.model import Direction
+
+FLIP_HORIZONTAL = 1
+FLIP_VERTICAL = 2
+TRANSPOSE = 4
+
+
+def flip_horizontal(board: int) -> int:
+    """
+    Mirror a packed board left to right.
+    """
+    return (((board & 0x000F000F000F000F) << 12) | ((board & 0x00F000F000F000F0) << 4)
+            | ((board >> 4) & 0x00F000F000F000F0) | ((board >> 12) & 0x000F000F000F000F))
+
+
+def flip_vertical(board: int) -> int:
+    """
+    Mirror a packed board top to bottom.
+    """
+    return (((board & 0xFFFF) << 48) | (((board >> 16) & 0xFFFF) << 32)
+            | (((board >> 32) & 0xFFFF) << 16) | (board >> 48))
+
+
+def apply_transform(board: int, transform: int) -> int:
+    """
+    Apply one of the 8 transforms to a packed board.
+    """
+    if transform & FLIP_HORIZONTAL:
+        board = flip_horizontal(board)
+    if transform & FLIP_VERTICAL:
+        board = flip_vertical(board)
+    if transform & TRANSPOSE:
+        board = bitboard.transpose(board)
+    return board
+
+
+def _map_direction(direction: Direction, transform: int) -> Direction:
+    if transform & FLIP_HORIZONTAL:
+        direction = {Direction.LEFT: Direction.RIGHT, Direction.RIGHT: Direction.LEFT}.get(direction, direction)
+    if transform & FLIP_VERTICAL:
+        direction = {Direction.UP: Direction.DOWN, Direction.DOWN: Direction.UP}.get(direction, direction)
+    if transform & TRANSPOSE:
+        direction = {Direction.UP: Direction.LEFT, Direction.LEFT: Direction.UP,
+                     Direction.DOWN: Direction.RIGHT, Direction.RIGHT: Direction.DOWN}[direction]
+    return direction
+
+
+# DIRECTION_MAP[transform][direction.value] is the direction on the
+# transformed board matching the direction on the original board
+DIRECTION_MAP = [[_map_direction(direction, transform) for direction in Direction] for transform in range(8)]
+INVERSE_DIRECTION_MAP = [[None] * 4 for _ in range(8)]
+for _transform in range(8):
+    for _direction in Direction:
+        INVERSE_DIRECTION_MAP[_transform][DIRECTION_MAP[_transform][_direction.value].value] = _direction
+
+
+def map_direction(direction: Direction, transform: int) -> Direction:
+    """
+    Return the direction on the transformed board that matches moving in the
+    given direction on the original board.
+    """
+    return DIRECTION_MAP[transform][direction.value]
+
+
+def unmap_direction(direction: Direction, transform: int) -> Direction:
+    """
+    Return the direction on the original board that matches moving in the
+    given direction on the transformed board.
+    """
+    return INVERSE_DIRECTION_MAP[transform][direction.value]
+
+
+def canonicalize(board: Union[int, List[List[int]], np.ndarray]) -> Tuple[int, int]:
+    """
+    Map a board, either packed or as a 4x4 grid of tile values, to its
+    canonical packed board. Returns the canonical board and the transform
+    that produces it from the given board.
+    """
+    if not isinstance(board, int):
+        board = bitboard.pack(board)
+
+    h = flip_horizontal(board)
+    v = flip_vertical(board)
+    hv = flip_vertical(h)
+    candidates = (board, h, v, hv)
+
+    best = board
+    best_transform = 0
+    for transform in range(1, 8):
+        candidate = candidates[transform & 3]
+        if transform & TRANSPOSE:
+            candidate = bitboard.transpose(candidate)
+        if candidate < best:
+            best = candidate
+            best_transform = transform
+    return best, best_transform
+
+
+def canonical_key(board: int) -> int:
+    """
+    Return only the canonical packed board.
+    """
+    return canonicalize(board)[0]
+
+
+_PACK_SHIFTS = (4 * np.arange(16)).astype(np.uint64)
+
+
+def canonical_keys(boards: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized canonicalize for an (N, 4, 4) array of tile exponents.
+    Returns the canonical packed boards as uint64 and the transforms used.
+    """
+    boards = np.asarray(boards)
+    keys = np.empty((8, len(boards)), dtype=np.uint64)
+    for transform in range(8):
+        transformed = boards
+        if transform & FLIP_HORIZONTAL:
+            transformed = transformed[:, :, ::-1]
+        if transform & FLIP_VERTICAL:
+            transformed = transformed[:, ::-1, :]
+        if transform & TRANSPOSE:
+            transformed = transformed.transpose(0, 2, 1)
+        flat = transformed.reshape(len(boards), 16).astype(np.uint64)
+        keys[transform] = (flat << _PACK_SHIFTS).sum(axis=1, dtype=np.uint64)
+    transforms = keys.argmin(axis=0)
+    return keys[transforms, np.arange(len(boards))], transforms
+
+
+def dedup_states(boards: np.ndarray) -> np.ndarray:
+    """
+    Return the indices of the first occurrence of every distinct board in
+    an (N, 4, 4) array of tile exponents, treating boards that are
+    rotations or reflections of each other as the same board.
+    """
+    keys, _ = canonical_keys(boards)
+    _, indices = np.unique(keys, return_index=True)
+    return np.sort(indices)
@@ -0,0 +1,195 @@
+"""
+N-tuple network value function for 2048 trained with TD(0) on afterstates.
+
+Every tuple is a list of board cells. The log2 values of the tiles in those
+cells form an index into that tuple's weight table, and the value of a board
+is the sum of the indexed weights. Each tuple is also applied to the 7 other
+rotations and reflections of the board, which shares the weights between
+strategically identical positions.
+
+Training plays a whole batch of games in lockstep on a BatchGameModel so
+every step evaluates and updates batch_size afterstates with a handful of
+NumPy calls.
+"""
+from pathlib import Path
+from time import perf_counter
+from typing import List, Optional, Sequence
+import os
+import numpy as np
+from twenty.batch import BatchGameModel, slide
+
+
+# Two straight rows and three 2x2 squares. Cells are numbered 4 * x + y.
+DEFAULT_TUPLES = [
+    (0, 1, 2, 3),
+    (4, 5, 6, 7),
+    (0, 1, 4, 5),
+    (1, 2, 5, 6),
+    (5, 6, 9, 10),
+]
+
+
+def symmetric_cells() -> List[List[int]]:
+    """
+    Return the 8 dihedral transforms of the board as lists mapping every
+    cell to the cell it moves to.
+    """
+    transforms = []
+    cells = np.arange(16).reshape(4, 4)
+    for grid in (cells, cells.T):
+        for k in range(4):
+            transforms.append(np.rot90(grid, k).ravel().tolist())
+    return transforms
+
+
+class NTupleNetwork:
+    """
+    Afterstate value function made of one weight table per tuple. All tuples
+    must have the same number of cells.
+    """
+    def __init__(self, tuples: Sequence[Sequence[int]] = DEFAULT_TUPLES, weights: Optional[np.ndarray] = None):
+        self.tuples = np.array(tuples, dtype=np.int64)
+        num_tuples, tuple_size = self.tuples.shape
+        if weights is None:
+            weights = np.zeros((num_tuples, 16 ** tuple_size), dtype=np.float32)
+        self.weights = weights
+
+        # Every tuple under every symmetry, as (features, tuple_size) cells
+        features = [[transform[cell] for cell in tup] for tup in self.tuples.tolist()
+                    for transform in symmetric_cells()]
+        self.feature_cells = np.array(features, dtype=np.int64)
+        self.feature_tables = np.repeat(np.arange(num_tuples, dtype=np.int64), 8)
+        self.shifts = 4 * np.arange(tuple_size, dtype=np.int64)
+
+    @property
+    def num_features(self) -> int:
+        return len(self.feature_cells)
+
+    def feature_indices(self, boards: np.ndarray) -> np.ndarray:
+        """
+        Return the (N, features) flat indices into the weights for a batch
+        of (N, 4, 4) boards of tile exponents.
+        """
+        cells = boards.reshape(len(boards), 16)[:, self.feature_cells].astype(np.int64)
+        offsets = self.feature_tables * self.weights.shape[1]
+        return (cells << self.shifts).sum(axis=2) + offsets
+
+    def value(self, boards: np.ndarray) -> np.ndarray:
+        """
+        Return the value of every board in a batch of (N, 4, 4) boards.
+        """
+        return self.weights.reshape(-1)[self.feature_indices(boards)].sum(axis=1)
+
+    def update(self, boards: np.ndarray, deltas: np.ndarray):
+        """
+        Add deltas[i] to every weight used by boards[i]. Weights used by
+        several boards of the batch get the average of their deltas so a
+        large batch of similar boards does not multiply the step size.
+        """
+        indices = self.feature_indices(boards).ravel()
+        unique, inverse = np.unique(indices, return_inverse=True)
+        sums = np.bincount(inverse, weights=np.repeat(deltas, self.num_features))
+        counts = np.bincount(inverse)
+        self.weights.reshape(-1)[unique] += (sums / counts).astype(self.weights.dtype)
+
+    def save(self, path: str):
+        """
+        Write the network to the checkpoint directory. Files are written
+        next to their final name and moved into place, so an interrupted
+        save never leaves a truncated checkpoint behind.
+        """
+        directory = Path(path)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, array in (('tuples', self.tuples), ('weights', self.weights)):
+            temp_path = directory / (name + '.tmp.npy')
+            np.save(temp_path, array)
+            os.replace(temp_path, directory / (name + '.npy'))
+
+    @staticmethod
+    def load(path: str, mmap_mode: Optional[str] = 'r'):
+        """
+        Load a network from a checkpoint directory. By default the weights
+        are memory mapped read only, which is enough for playing. Pass
+        mmap_mode=None to load a copy that can be trained further.
+        """
+        directory = Path(path)
+        tuples = np.load(directory / 'tuples.npy')
+        weights = np.load(directory / 'weights.npy', mmap_mode=mmap_mode)
+        return NTupleNetwork(tuples, weights)
+
+    def best_moves(self, boards: np.ndarray, legal: np.ndarray):
+        """
+        Pick the move maximizing reward plus afterstate value for every
+        board. Returns the directions, the chosen afterstates and rewards.
+        """
+        num_boards = len(boards)
+        directions = np.repeat(np.arange(4), num_boards)
+        afterstates, rewards = slide(np.tile(boards, (4, 1, 1)), directions)
+        values = rewards + self.value(afterstates)
+
+        values = values.reshape(4, num_boards).T
+        values[~legal] = -np.inf
+        best = values.argmax(axis=1)
+        chosen = best * num_boards + np.arange(num_boards)
+        return best, afterstates[chosen], rewards[chosen]
+
+
+def train_ntuple(num_steps: int = 100000, batch_size: int = 1024, learning_rate: float = 0.1,
+                 checkpoint_path: Optional[str] = None, checkpoint_interval: int = 1000,
+                 resume: bool = False, seed: Optional[int] = None) -> NTupleNetwork:
+    """
+    Train an n-tuple network with TD(0) on afterstates by playing
+    batch_size games in lockstep for num_steps moves each. The network is
+    saved to checkpoint_path every checkpoint_interval steps and at the end.
+    """
+    if resume and checkpoint_path is not None and (Path(checkpoint_path) / 'weights.npy').exists():
+        network = NTupleNetwork.load(checkpoint_path, mmap_mode=None)
+    else:
+        network = NTupleNetwork()
+    # Spread the step size over all the weights that make up a value
+    alpha = learning_rate / network.num_features
+
+    model = BatchGameModel(batch_size, seed=seed)
+    previous = np.zeros_like(model.boards)
+    has_previous = np.zeros(batch_size, dtype=bool)
+    legal = model.legal_moves()
+
+    games_finished = 0
+    recent_games = 0
+    recent_score = 0
+    start = perf_counter()
+    for step in range(1, num_steps + 1):
+        directions, afterstates, rewards = network.best_moves(model.boards, legal)
+
+        # TD(0): move the value of the previous afterstate towards the
+        # reward of this move plus the value of the new afterstate
+        if has_previous.any():
+            target = rewards[has_previous] + network.value(afterstates[has_previous])
+            error = target - network.value(previous[has_previous])
+            network.update(previous[has_previous], alpha * error)
+
+        _, dones, legal = model.step(directions)
+
+        # The afterstate that led to the end of the game is worth nothing
+        if dones.any():
+            network.update(afterstates[dones], -alpha * network.value(afterstates[dones]))
+            games_finished += int(dones.sum())
+            recent_games += int(dones.sum())
+            recent_score += int(model.final_scores[dones].sum())
+
+        previous = afterstates
+        has_previous = ~dones
+
+        if step % checkpoint_interval == 0:
+            elapsed = perf_counter() - start
+            print('Step: {} Games: {} Mean score: {:.0f} Updates/sec: {:.0f}'.format(
+                step, games_finished, recent_score / max(recent_games, 1), step * batch_size / elapsed))
+            recent_games = 0
+            recent_score = 0
+            if checkpoint_path is not None:
+                network.save(checkpoint_path)
+
+    if checkpoint_path is not None:
+        network.save(checkpoint_path)
+    return network
+
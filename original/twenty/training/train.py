@@ -12,6 +12,8 @@ from tf_agents.policies.policy_saver import PolicySaver
 import tf_agents.trajectories.time_step as ts
 from tf_agents.environments import tf_py_environment
 from twenty.model import GameModel, Direction
+from twenty.training.vector_env import VectorGameEnvironment
+from typing import List, Optional
 import copy
 import numpy as np
 
@@ -25,6 +27,9 @@ class GameEnvironment(PyEnvironment):
         self.initial_board = copy.deepcopy(game)
 
         self.game = game
+        # Every episode keeps drawing from the game's random stream instead
+        # of replaying the copy taken with the initial board
+        self.rng = game.rng
         # The action correspond to the direction of the move
         self._action_spec = array_spec.BoundedArraySpec(shape=(), dtype=np.int32, minimum=0, maximum=3, name='action')
         # The observation is the board state
@@ -47,6 +52,7 @@ class GameEnvironment(PyEnvironment):
 
     def _reset(self):
         self.game = copy.deepcopy(self.initial_board)
+        self.game.rng = self.rng
         self._state = self.game.tiles
         self._episode_ended = False
         return ts.restart(self._state)
@@ -67,6 +73,74 @@ class GameEnvironment(PyEnvironment):
         return ts.transition(self._state, reward=self.game.score, discount=1)
 
 
+class BatchGameEnvironment(PyEnvironment):
+    """
+    Batched implementation of the tensorflow agent environment that plays
+    batch_size games at once on a vectorized simulator. Observations are the
+    log2 of the tile values as uint8, or one-hot planes when one_hot is set.
+    """
+    def __init__(self, batch_size: int, initial_state: Optional[List[List[int]]] = None,
+                 seed: Optional[int] = None, one_hot: bool = False):
+        super(BatchGameEnvironment, self).__init__()
+        # Finished games are restarted by _step so the time steps follow the
+        # usual LAST then FIRST sequence
+        self._env = VectorGameEnvironment(batch_size, initial_state, seed, one_hot, auto_reset=False)
+
+        self._action_spec = array_spec.BoundedArraySpec(shape=(), dtype=np.int32, minimum=0, maximum=3, name='action')
+        self._observation_spec = array_spec.BoundedArraySpec(
+            shape=self._env.observation_shape, dtype=np.uint8, minimum=0,
+            maximum=1 if one_hot else VectorGameEnvironment.num_planes - 1, name='observation')
+        self._reward_spec = array_spec.ArraySpec(shape=(), dtype=np.float32, name='reward')
+
+        self._episode_ended = np.zeros(batch_size, dtype=bool)
+
+    @property
+    def batched(self):
+        return True
+
+    @property
+    def batch_size(self):
+        return self._env.batch_size
+
+    def action_spec(self):
+        return self._action_spec
+
+    def observation_spec(self):
+        return self._observation_spec
+
+    def reward_spec(self):
+        return self._reward_spec
+
+    def legal_moves(self) -> np.ndarray:
+        """
+        Return the (batch_size, 4) mask of legal directions for every game.
+        """
+        return self._env.model.legal_moves()
+
+    def _reset(self):
+        self._episode_ended[:] = False
+        # The vector environment reuses its observation buffer on every step,
+        # while drivers keep the previous time step around to build the
+        # trajectory, so every time step gets its own copy
+        observation = self._env.reset().copy()
+        return ts.restart(observation, batch_size=self.batch_size, reward_spec=self._reward_spec)
+
+    def _step(self, action):
+        # Games that ended on the previous step cannot move, so they are
+        # unaffected by the step and get restarted afterwards
+        restarted = self._episode_ended.copy()
+        observation, rewards, dones, _ = self._env.step(action)
+        if restarted.any():
+            self._env.model.reset(np.flatnonzero(restarted))
+
+        step_type = np.where(restarted, ts.StepType.FIRST,
+                             np.where(dones, ts.StepType.LAST, ts.StepType.MID)).astype(np.int32)
+        reward = np.where(restarted, 0, rewards).astype(np.float32)
+        discount = np.where(dones & ~restarted, 0, 1).astype(np.float32)
+        self._episode_ended = dones & ~restarted
+        return ts.TimeStep(step_type, reward, discount, self._env.observation().copy())
+
+
 def train():
     # Hyperparameters
     num_iterations = 20000
@@ -0,0 +1,62 @@
+from typing import List, Optional, Tuple
+import numpy as np
+from twenty.batch import BatchGameModel
+from twenty.bitboard import MAX_EXPONENT
+
+
+class VectorGameEnvironment:
+    """
+    Plain NumPy environment that plays batch_size games at once on top of a
+    BatchGameModel. Observations are the log2 of the tile values as uint8
+    (0 for an empty cell), or one-hot planes of shape (4, 4, num_planes)
+    where plane k is set for the cells holding 2 ** k.
+
+    Observations are written into buffers owned by the environment, so the
+    returned array is overwritten by the next step. Copy it to keep it.
+    """
+    num_planes = MAX_EXPONENT + 1
+
+    def __init__(self, batch_size: int, initial_state: Optional[List[List[int]]] = None,
+                 seed: Optional[int] = None, one_hot: bool = False, auto_reset: bool = True):
+        self.batch_size = batch_size
+        self.one_hot = one_hot
+        self.model = BatchGameModel(batch_size, initial_state, seed, auto_reset)
+
+        self._planes = None
+        self._plane_values = None
+        if self.one_hot:
+            self._planes = np.zeros((batch_size, 4, 4, self.num_planes), dtype=bool)
+            self._plane_values = np.arange(self.num_planes, dtype=np.uint8)
+
+    @property
+    def observation_shape(self) -> Tuple[int, ...]:
+        """
+        Shape of the observation of a single game.
+        """
+        if self.one_hot:
+            return (4, 4, self.num_planes)
+        return (4, 4)
+
+    def observation(self) -> np.ndarray:
+        """
+        Return the current observation of every game.
+        """
+        if not self.one_hot:
+            return self.model.boards
+        np.equal(self.model.boards[..., None], self._plane_values, out=self._planes)
+        return self._planes.view(np.uint8)
+
+    def reset(self) -> np.ndarray:
+        """
+        Start a new game on every board and return the observations.
+        """
+        self.model.reset()
+        return self.observation()
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Play one move on every board. Returns the observations, the rewards,
+        the done flags and the (batch_size, 4) legal move mask.
+        """
+        rewards, dones, mask = self.model.step(actions)
+        return self.observation(), rewards, dones, mask
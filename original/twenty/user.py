@@ -1,18 +1,26 @@
 from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional, Tuple
+from time import perf_counter
 from twenty.model import Direction
+from twenty import bitboard
+from twenty.bitboard import BitboardModel
+from twenty.heuristics import RowHeuristic
+from twenty.symmetry import canonical_key
+from twenty.training.ntuple import NTupleNetwork
+import numpy as np
 import pygame
 
 
 class User(ABC):
-    def move(self) -> Direction:
+    def move(self, model) -> Direction:
         """
-        Get the next move from the user.
+        Get the next move from the user for the given game state.
         """
         pass
 
 
 class HumanUser(User):
-    def move(self) -> Direction:
+    def move(self, model) -> Direction:
         """
         Get the next move from the user. This user works based on the
         arrow keys.
@@ -34,3 +42,162 @@ class HumanUser(User):
                         exit()
 
             pygame.time.wait(10)
+
+
+class SearchStats:
+    """
+    Statistics about a single search.
+    """
+    def __init__(self):
+        self.nodes = 0
+        self.cache_hits = 0
+        self.seconds = 0.0
+
+    @property
+    def nodes_per_second(self) -> float:
+        if self.seconds == 0:
+            return 0.0
+        return self.nodes / self.seconds
+
+    def __repr__(self):
+        return 'SearchStats(nodes={}, cache_hits={}, seconds={:.4f}, nodes_per_second={:.0f})'.format(
+            self.nodes, self.cache_hits, self.seconds, self.nodes_per_second)
+
+
+class ExpectimaxUser(User):
+    """
+    Automated player that picks moves with a depth limited expectimax search
+    over the player moves and the tile spawns (2 at 90%, 4 at 10%). Spawn
+    branches whose cumulative probability drops below min_probability are
+    cut off and scored with the heuristic directly.
+
+    Boards with no legal move are worth loss_value, or their heuristic
+    value when it is None, so adding a constant to the heuristic does not
+    change the moves picked. RowHeuristic adds its lost_penalty to every
+    board so that a lost board worth 0.0 ranks below any live one, and
+    the default player values lost boards that way.
+
+    With symmetric_cache the search cache is keyed by the canonical board, so
+    rotations and reflections of a searched board are cache hits. Only use it
+    with heuristics that score symmetric boards the same, like RowHeuristic.
+    """
+    def __init__(self, depth: int = 2, heuristic: Callable[[int], float] = None,
+                 min_probability: float = 0.0001, symmetric_cache: bool = False,
+                 loss_value: Optional[float] = None):
+        self.depth = depth
+        if heuristic is None:
+            heuristic = RowHeuristic()
+            if loss_value is None:
+                loss_value = 0.0
+        self.heuristic = heuristic
+        self.loss_value = loss_value
+        self.min_probability = min_probability
+        self.symmetric_cache = symmetric_cache
+        self.stats = SearchStats()
+        self._cache: Dict[int, Tuple[int, float]] = dict()
+
+    def move(self, model) -> Direction:
+        """
+        Search the given game state and return the best direction.
+        """
+        if isinstance(model, BitboardModel):
+            board = model.board
+        else:
+            board = bitboard.pack(model.tiles)
+
+        self.stats = SearchStats()
+        self._cache = dict()
+        start = perf_counter()
+
+        best_direction = Direction.UP
+        best_value = None
+        for direction in Direction:
+            new_board, _ = bitboard.MOVES[direction.value](board)
+            if new_board == board:
+                continue
+            value = self.chance_node(new_board, self.depth - 1, 1.0)
+            if best_value is None or value > best_value:
+                best_value = value
+                best_direction = direction
+
+        self.stats.seconds = perf_counter() - start
+        return best_direction
+
+    def max_node(self, board: int, depth: int, probability: float) -> float:
+        """
+        Value of a board where the player is about to move.
+        """
+        self.stats.nodes += 1
+        best_value = float('-inf')
+        for move in bitboard.MOVES:
+            new_board, _ = move(board)
+            if new_board == board:
+                continue
+            value = self.chance_node(new_board, depth - 1, probability)
+            if value > best_value:
+                best_value = value
+        if best_value == float('-inf'):
+            return self.heuristic(board) if self.loss_value is None else self.loss_value
+        return best_value
+
+    def chance_node(self, board: int, depth: int, probability: float) -> float:
+        """
+        Value of a board where a tile is about to be spawned, averaged over
+        every empty cell and both tile values.
+        """
+        self.stats.nodes += 1
+        if depth <= 0 or probability < self.min_probability:
+            return self.heuristic(board)
+
+        # Boards reached through different move orders are only searched
+        # once as long as the cached search was at least as deep.
+        key = canonical_key(board) if self.symmetric_cache else board
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] >= depth:
+            self.stats.cache_hits += 1
+            return cached[1]
+
+        num_empty = bitboard.count_empty(board)
+        if num_empty == 0:
+            return self.heuristic(board)
+        probability /= num_empty
+
+        total = 0.0
+        for i in range(16):
+            shift = 4 * i
+            if (board >> shift) & 0xF != 0:
+                continue
+            total += 0.9 * self.max_node(board | (1 << shift), depth, probability * 0.9)
+            total += 0.1 * self.max_node(board | (2 << shift), depth, probability * 0.1)
+        value = total / num_empty
+
+        self._cache[key] = (depth, value)
+        return value
+
+
+class NTupleUser(User):
+    """
+    Automated player that greedily picks the move with the highest reward
+    plus afterstate value according to a trained n-tuple network.
+    """
+    def __init__(self, network: NTupleNetwork):
+        self.network = network
+
+    @staticmethod
+    def from_checkpoint(path: str):
+        """
+        Create a player from a checkpoint, memory mapping the weights.
+        """
+        return NTupleUser(NTupleNetwork.load(path))
+
+    def move(self, model) -> Direction:
+        tiles = np.asarray(model.tiles)
+        exponents = np.zeros((1, 4, 4), dtype=np.uint8)
+        nonzero = tiles > 0
+        exponents[0][nonzero] = np.log2(tiles[nonzero]).astype(np.uint8)
+
+        legal = np.array([[bool(model.legal_moves() & (1 << d.value)) for d in Direction]])
+        if not legal.any():
+            return Direction.UP
+        directions, _, _ = self.network.best_moves(exponents, legal)
+        return Direction(int(directions[0]))
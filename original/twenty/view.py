@@ -1,31 +1,50 @@
 import pygame
+import numpy as np
 from twenty.model import GameModel
 
+TILE_SIZE = 100
+
+
 class TileView:
     """
-    View for a single tile. Displays the number.
+    View for the tiles. Displays the number of a tile. The text for every
+    tile value is only rendered the first time it is drawn.
     """
-    def __init__(self, screen, number: int):
+    def __init__(self, screen, font):
         self.screen = screen
-        self.number = number
-        self.font = pygame.font.SysFont("monospace", 50)
+        self.font = font
+        self.glyphs = dict()
+
+    def get_glyph(self, number: int):
+        """
+        Return the rendered text for the given tile value.
+        """
+        glyph = self.glyphs.get(number)
+        if glyph is None:
+            glyph = self.font.render(str(number), 1, (255, 255, 255))
+            self.glyphs[number] = glyph
+        return glyph
 
-    def draw(self, x: int, y: int):
+    def draw(self, number: int, x: int, y: int):
         """
         Draw the tile on the screen.
         """
-        text = self.font.render(str(self.number), 1, (255, 255, 255))
-        self.screen.blit(text, (y, x))
+        self.screen.blit(self.get_glyph(number), (y, x))
 
 
 class GameView:
     """
     Implements the view logic for the 2048 game. This has the ability to take
-    in a board and produce the cooresponding view of the tiles.
+    in a board and produce the cooresponding view of the tiles. After the
+    first frame only the cells that changed since the previous frame are
+    redrawn.
     """
     def __init__(self, screen, board: GameModel):
         self.screen = screen
         self.board = board
+        self.tile_view = TileView(screen, pygame.font.SysFont("monospace", 50))
+        # Tiles shown on the screen, None until the first full draw
+        self.drawn_tiles = None
 
     def update(self, board: GameModel):
         """
@@ -37,13 +56,25 @@ class GameView:
         """
         Draws the board to the screen.
         """
-        # Clear the screen to black
-        self.screen.fill((0, 0, 0))
+        tiles = np.array(self.board.tiles)
 
-        # Print all of the numbers
-        for x in range(4):
-            for y in range(4):
-                TileView(self.screen, self.board.tiles[x][y]).draw(x * 100, y * 100)
+        if self.drawn_tiles is None:
+            # Clear the screen to black
+            self.screen.fill((0, 0, 0))
 
-        pygame.display.update()
+            # Print all of the numbers
+            for x in range(4):
+                for y in range(4):
+                    self.tile_view.draw(tiles[x][y], x * TILE_SIZE, y * TILE_SIZE)
+            pygame.display.update()
+        else:
+            dirty_rects = []
+            for x, y in np.argwhere(tiles != self.drawn_tiles):
+                rect = pygame.Rect(y * TILE_SIZE, x * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+                self.screen.fill((0, 0, 0), rect)
+                self.tile_view.draw(tiles[x][y], x * TILE_SIZE, y * TILE_SIZE)
+                dirty_rects.append(rect)
+            if len(dirty_rects) > 0:
+                pygame.display.update(dirty_rects)
 
+        self.drawn_tiles = tiles
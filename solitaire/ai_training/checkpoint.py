@@ -0,0 +1,69 @@
+import os
+import pickle
+import struct
+import zlib
+
+
+class CheckpointLog:
+    '''
+    Append-only file of training checkpoints. Every record is written as a
+    length and CRC32 header followed by the pickled record, in a single
+    write that is flushed to disk before returning. A record cut short by a
+    crash fails its length or checksum test and is ignored, and dropped
+    before anything else is appended, so the last complete record is always
+    the one that is loaded.
+    '''
+    HEADER = struct.Struct('<II')
+
+    def __init__(self, path):
+        self.path = path
+        self.tail_checked = False
+
+    def records(self):
+        '''
+        Yield every complete record in the file along with the offset just
+        past it.
+        '''
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as log_file:
+            offset = 0
+            while True:
+                header = log_file.read(CheckpointLog.HEADER.size)
+                if len(header) < CheckpointLog.HEADER.size:
+                    return
+                length, checksum = CheckpointLog.HEADER.unpack(header)
+                payload = log_file.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    return
+                offset += CheckpointLog.HEADER.size + length
+                yield pickle.loads(payload), offset
+
+    def load_last(self):
+        '''
+        Return the last complete record, or None when there is none.
+        '''
+        last = None
+        for record, _ in self.records():
+            last = record
+        return last
+
+    def valid_length(self):
+        length = 0
+        for _, offset in self.records():
+            length = offset
+        return length
+
+    def append(self, record):
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        data = CheckpointLog.HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        if not self.tail_checked and os.path.exists(self.path):
+            # Drop a partial record left behind by an interrupted write
+            valid_length = self.valid_length()
+            if os.path.getsize(self.path) != valid_length:
+                os.truncate(self.path, valid_length)
+        self.tail_checked = True
+        with open(self.path, 'ab') as log_file:
+            log_file.write(data)
+            log_file.flush()
+            os.fsync(log_file.fileno())
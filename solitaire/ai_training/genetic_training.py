@@ -1,6 +1,10 @@
-from users.genetic_bot import GeneticBot
-from random import randint, randrange
+from users.genetic_bot import GeneticBot, FitnessStats
+from game.game_config import GameConfig
+from ai_training.vectorized_evaluation import LockstepEvaluator, dna_matrix
+from ai_training.checkpoint import CheckpointLog
+from random import randint, randrange, getstate, setstate
 from configparser import ConfigParser
+from concurrent.futures import ProcessPoolExecutor
 import os
 from pathlib import Path
 from copy import deepcopy
@@ -16,19 +20,71 @@ class GeneticConfig:
         self.mutation_rate = float(raw_config['mutation_rate'])
         self.mutation_step = float(raw_config['mutation_step'])
         self.target_score = int(raw_config['target_score'])
+        self.num_workers = int(raw_config.get('num_workers', '1'))
+        self.games_per_genome = int(raw_config.get('games_per_genome', '1'))
+        self.fitness_aggregate = raw_config.get('fitness_aggregate', 'mean')
+        self.vectorized_evaluation = raw_config.getboolean('vectorized_evaluation', False)
+        self.checkpoint_interval = int(raw_config.get('checkpoint_interval', '1'))
+
+
+def evaluate_genome(game_config, dna_params, seeds, aggregate):
+    """
+    Play one headless game per tile seed with the given DNA. Runs in the
+    worker processes, so only the DNA and the seeds are sent over and only
+    the scores and stats are sent back.
+    """
+    params = {'game_display': False, 'dna_init': dna_params}
+    bot = GeneticBot(game_config, params)
+    bot.evaluate_fitness(seeds, aggregate)
+    return bot.fitness_stats, bot.user_stats.moves_made, bot.user_stats.time_taken
 
 
 class Generation:
-    def __init__(self, game_config_path, genetic_config, number, params, parents=None):
-        self.game_config_path = game_config_path
+    def __init__(self, game_config, genetic_config, number, params, parents=None, bots=None):
+        self.game_config = game_config
         self.genetic_config = genetic_config
         self.bots = []
         self.number = number
-        self.initialize_population(parents, params)
+        if bots is not None:
+            self.bots = bots
+        else:
+            self.initialize_population(parents, params)
+
+    def to_checkpoint(self):
+        """
+        Everything needed to continue training after this generation. The
+        random state is taken last so a resumed run draws the same numbers
+        as one that was never interrupted.
+        """
+        return {
+            'generation': self.number,
+            'genomes': [dict(bot.dna.__dict__) for bot in self.bots],
+            'ids': [bot.id for bot in self.bots],
+            'scores': [bot.fitness_stats.scores for bot in self.bots],
+            'random_state': getstate(),
+        }
+
+    @staticmethod
+    def from_checkpoint(game_config, genetic_config, params, record):
+        """
+        Rebuild an evaluated generation from a checkpoint record and restore
+        the random state saved with it.
+        """
+        bots = []
+        for genome, bot_id, scores in zip(record['genomes'], record['ids'], record['scores']):
+            bot_params = deepcopy(params)
+            bot_params['dna_init'] = genome
+            bot = GeneticBot(game_config, bot_params)
+            bot.id = bot_id
+            bot.fitness_stats = FitnessStats(scores, genetic_config.fitness_aggregate)
+            bot.fitness = bot.fitness_stats.fitness
+            bots.append(bot)
+        setstate(record['random_state'])
+        return Generation(game_config, genetic_config, record['generation'], params, bots=bots)
 
     def initialize_original_population(self, params):
         for i in range(0, self.genetic_config.population_size):
-            self.bots.append(GeneticBot(self.game_config_path, params))
+            self.bots.append(GeneticBot(self.game_config, params))
 
     def get_parent(self, parents):
         if len(parents) == 1:
@@ -59,7 +115,7 @@ class Generation:
                 mutation_change = self.genetic_config.mutation_step * randrange(-1, 2, 2)
                 dna_params[key] = dna_params[key] + mutation_change
         genetic_params['dna_init'] = dna_params
-        return GeneticBot(self.game_config_path, genetic_params)
+        return GeneticBot(self.game_config, genetic_params)
 
     def produce_generation(self, parents, params):
         parents = sorted(parents, key=lambda parent: parent.fitness)
@@ -76,9 +132,41 @@ class Generation:
         else:
             self.produce_generation(parents, params)
 
-    def evaluate_fitness(self):
-        for bot in self.bots:
-            bot.evaluate_fitness()
+    def evaluate_fitness(self, executor=None):
+        # Every bot of the generation plays the same games (common random
+        # numbers), so differences in fitness come from the DNA and not from
+        # luckier tiles. The seeds are drawn up front so serial and parallel
+        # evaluation play the same games.
+        seeds = [randrange(2 ** 32) for _ in range(self.genetic_config.games_per_genome)]
+        aggregate = self.genetic_config.fitness_aggregate
+        if self.genetic_config.vectorized_evaluation:
+            self.evaluate_fitness_lockstep(seeds, aggregate)
+            return
+        if executor is None:
+            for bot in self.bots:
+                bot.evaluate_fitness(seeds, aggregate)
+            return
+
+        num_bots = len(self.bots)
+        dna_params = [dict(bot.dna.__dict__) for bot in self.bots]
+        results = executor.map(evaluate_genome, [self.game_config] * num_bots, dna_params,
+                               [seeds] * num_bots, [aggregate] * num_bots)
+        for bot, (fitness_stats, moves_made, time_taken) in zip(self.bots, results):
+            bot.fitness_stats = fitness_stats
+            bot.fitness = fitness_stats.fitness
+            # The score of the last game, as GeneticBot.evaluate_fitness leaves it
+            bot.user_stats.user_score = fitness_stats.scores[-1]
+            bot.user_stats.moves_made = moves_made
+            bot.user_stats.time_taken = time_taken
+
+    def evaluate_fitness_lockstep(self, seeds, aggregate):
+        evaluator = LockstepEvaluator(self.game_config)
+        scores, moves = evaluator.evaluate(dna_matrix([bot.dna for bot in self.bots]), seeds)
+        for bot, bot_scores, bot_moves in zip(self.bots, scores.tolist(), moves.tolist()):
+            bot.fitness_stats = FitnessStats(bot_scores, aggregate)
+            bot.fitness = bot.fitness_stats.fitness
+            bot.user_stats.user_score = bot_scores[-1]
+            bot.user_stats.moves_made = sum(bot_moves)
 
     def get_most_fit(self):
         return sorted(self.bots, key=lambda bot: bot.fitness)[-1]
@@ -88,28 +176,61 @@ def display_gen_details(population):
     most_fit = population.get_most_fit()
     print('Gen: ' + str(population.number))
     print('Score: ' + str(most_fit.fitness))
+    print(most_fit.fitness_stats)
     print(population.get_most_fit().dna)
 
 
-def training(params: dict) -> None:
+def save_checkpoint(checkpoint_log, population, genetic_config):
+    if checkpoint_log is not None and population.number % genetic_config.checkpoint_interval == 0:
+        checkpoint_log.append(population.to_checkpoint())
+
+
+def training(params: dict, checkpoint_path=None, resume=False) -> None:
     # Read in genetic configuration
     current_dir = Path(os.path.dirname(os.path.abspath(__file__)))
     genetic_config_path = str(current_dir / '..' / 'resources' / 'config' / 'genetic_training.ini')
     genetic_config = GeneticConfig(genetic_config_path)
 
-    # Read in game configuration
-    game_config_path = str(current_dir / '..' / 'resources' / 'config' / 'base_config.ini')
-
-    # Establish first generation
-    gen_number = 0
-    population = Generation(game_config_path, genetic_config, gen_number, params)
-    population.evaluate_fitness()
-
-    display_gen_details(population)
+    # Read in game configuration once, every bot and worker shares it
+    game_config = GameConfig.read(str(current_dir / '..' / 'resources' / 'config' / 'base_config.ini'))
+
+    # Games are spread over a process pool when more than one worker is set
+    executor = None
+    if genetic_config.num_workers > 1:
+        executor = ProcessPoolExecutor(max_workers=genetic_config.num_workers)
+
+    # Generations are appended to the checkpoint log as they finish
+    checkpoint_log = None
+    if checkpoint_path is not None:
+        checkpoint_log = CheckpointLog(checkpoint_path)
+
+    try:
+        record = None
+        if resume and checkpoint_log is not None:
+            record = checkpoint_log.load_last()
+
+        if record is not None:
+            # Continue from the last checkpointed generation without
+            # evaluating it again
+            population = Generation.from_checkpoint(game_config, genetic_config, params, record)
+            gen_number = population.number
+            print('Resumed from gen: ' + str(gen_number))
+        else:
+            # Establish first generation
+            gen_number = 0
+            population = Generation(game_config, genetic_config, gen_number, params)
+            population.evaluate_fitness(executor)
+            save_checkpoint(checkpoint_log, population, genetic_config)
 
-    # Training loop
-    while population.get_most_fit().fitness < genetic_config.target_score:
-        gen_number += 1
-        population = Generation(game_config_path, genetic_config, gen_number, params, parents=population.bots)
-        population.evaluate_fitness()
         display_gen_details(population)
+
+        # Training loop
+        while population.get_most_fit().fitness < genetic_config.target_score:
+            gen_number += 1
+            population = Generation(game_config, genetic_config, gen_number, params, parents=population.bots)
+            population.evaluate_fitness(executor)
+            save_checkpoint(checkpoint_log, population, genetic_config)
+            display_gen_details(population)
+    finally:
+        if executor is not None:
+            executor.shutdown()
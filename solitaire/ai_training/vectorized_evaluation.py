@@ -0,0 +1,193 @@
+'''
+Evaluates a whole population of linear DNA policies by playing all of their
+games in lockstep. Every move consumes exactly one tile, so at step t every
+game that is still running places tile t of its seed. Each step builds the
+(games, candidates, features) tensor of GeneticBot's Move features for all
+games at once, scores every candidate against the DNA of its game and
+applies the chosen moves to the batched state.
+'''
+import numpy as np
+from game.game_config import GameConfig
+from game.game_model import DiscardPile, TileQueue
+
+# DNA weights in the order DNA.evaluate adds them up
+FEATURE_WEIGHTS = [
+    'merges_weight',
+    'height_largest_weight',
+    'height_lowest_weight',
+    'height_average_weight',
+    'num_discontinuities_weight',
+    'num_discards_weight',
+]
+
+
+def dna_matrix(dnas):
+    '''
+    Stack the weights of the given DNA into a (population, features) matrix.
+    '''
+    return np.array([[getattr(dna, name) for name in FEATURE_WEIGHTS] for dna in dnas], dtype=np.float64)
+
+
+class TileSequences:
+    '''
+    The tiles every seeded game will place, generated by TileQueue so they
+    match the serial games, as (seeds, steps) arrays of log2 values.
+    '''
+    def __init__(self, seeds, chunk_size=1024):
+        self.queues = [TileQueue(seed) for seed in seeds]
+        self.chunk_size = chunk_size
+        self.exponents = np.zeros((len(seeds), 0), dtype=np.int64)
+
+    def get(self, step):
+        while step >= self.exponents.shape[1]:
+            chunk = [[queue.pull().bit_length() - 1 for _ in range(self.chunk_size)] for queue in self.queues]
+            self.exponents = np.concatenate([self.exponents, np.array(chunk, dtype=np.int64)], axis=1)
+        return self.exponents[:, step]
+
+
+class LockstepEvaluator:
+    def __init__(self, game_config):
+        # Sizes come from the config rather than a GameModel, whose unseeded
+        # TileQueue would draw from the global random module
+        game_config = GameConfig.get(game_config)
+        self.num_stacks = game_config.num_stacks
+        self.max_stack_size = game_config.max_stack_size
+        self.max_discards = DiscardPile(self.num_stacks).max_discards
+        self.max_tiles = self.num_stacks * self.max_stack_size + self.max_discards
+
+    def evaluate(self, weights, seeds):
+        '''
+        Play every genome (row of the weights matrix) on every seed. Returns
+        the (population, seeds) final scores and move counts.
+        '''
+        population = len(weights)
+        num_seeds = len(seeds)
+        num_games = population * num_seeds
+        num_stacks = self.num_stacks
+        max_size = self.max_stack_size
+
+        # Game g is genome g // num_seeds playing seed g % num_seeds
+        game_weights = np.repeat(weights, num_seeds, axis=0)
+        game_seeds = np.tile(np.arange(num_seeds), population)
+        tiles = TileSequences(seeds)
+
+        # One spare slot per stack for the tile placed before merging
+        stacks = np.zeros((num_games, num_stacks, max_size + 1), dtype=np.int64)
+        heights = np.zeros((num_games, num_stacks), dtype=np.int64)
+        discards = np.zeros(num_games, dtype=np.int64)
+        scores = np.zeros(num_games, dtype=np.int64)
+        moves = np.zeros(num_games, dtype=np.int64)
+        running = np.ones(num_games, dtype=bool)
+
+        step = 0
+        while running.any():
+            games = np.flatnonzero(running)
+            tile = tiles.get(step)[game_seeds[games]]
+            choice, new_heights, new_tops, gained = self.choose_moves(
+                stacks[games], heights[games], discards[games], tile, game_weights[games])
+
+            # Apply the chosen moves
+            to_stack = choice < num_stacks
+            stack_games = games[to_stack]
+            stack_index = choice[to_stack]
+            stacks[stack_games, stack_index, new_heights[to_stack] - 1] = new_tops[to_stack]
+            heights[stack_games, stack_index] = new_heights[to_stack]
+            scores[stack_games] += gained[to_stack]
+            discards[games[~to_stack]] += 1
+            moves[games] += 1
+
+            game_over = (heights[games] == max_size).all(axis=1) & (discards[games] == self.max_discards)
+            running[games[game_over]] = False
+            step += 1
+
+        return scores.reshape(population, num_seeds), moves.reshape(population, num_seeds)
+
+    def choose_moves(self, stacks, heights, discards, tile, weights):
+        '''
+        Build the candidate features for a batch of games and pick the best
+        candidate of each game. Candidates 0 to num_stacks - 1 are the
+        stacks and candidate num_stacks is the discard pile.
+        '''
+        num_games = len(stacks)
+        num_stacks = self.num_stacks
+        max_size = self.max_stack_size
+        game_index = np.arange(num_games)[:, None]
+        stack_index = np.arange(num_stacks)[None, :]
+
+        # Discontinuities among the bottom j + 1 tiles of every stack
+        positions = np.arange(max_size)
+        increasing = (stacks[:, :, :max_size - 1] < stacks[:, :, 1:max_size]) & \
+            (positions[None, None, 1:] < heights[:, :, None])
+        prefix = np.zeros((num_games, num_stacks, max_size), dtype=np.int64)
+        prefix[:, :, 1:] = np.cumsum(increasing, axis=2)
+        stack_discontinuities = prefix[game_index, stack_index, np.maximum(heights - 1, 0)]
+        total_discontinuities = stack_discontinuities.sum(axis=1)
+        total_height = heights.sum(axis=1)
+
+        # Place the tile on every stack and follow the merge chain down
+        top = np.broadcast_to(tile[:, None], heights.shape).copy()
+        position = heights - 1
+        multiplier = np.ones_like(heights)
+        gained = np.zeros_like(heights)
+        merging = np.ones(heights.shape, dtype=bool)
+        for _ in range(max_size):
+            below = stacks[game_index, stack_index, np.maximum(position, 0)]
+            merging &= (position >= 0) & (below == top)
+            if not merging.any():
+                break
+            top = np.where(merging, top + 1, top)
+            gained += np.where(merging, (1 << top) * multiplier, 0)
+            multiplier += merging
+            position -= merging
+        new_heights = position + 2
+        legal = (heights < max_size) | (new_heights <= heights)
+
+        # Features of the stack candidates
+        kept = new_heights - 1
+        kept_discontinuities = prefix[game_index, stack_index, np.maximum(kept - 1, 0)] * (kept > 0)
+        kept_top = stacks[game_index, stack_index, np.maximum(kept - 1, 0)]
+        new_discontinuities = kept_discontinuities + ((kept > 0) & (kept_top < top))
+
+        sorted_heights = np.sort(heights, axis=1)
+        largest = sorted_heights[:, -1:]
+        lowest = sorted_heights[:, :1]
+        largest_without = np.where(heights != largest, largest, sorted_heights[:, -2:-1])
+        lowest_without = np.where(heights != lowest, lowest, sorted_heights[:, 1:2])
+
+        num_candidates = num_stacks + 1
+        features = np.zeros((num_games, num_candidates, len(FEATURE_WEIGHTS)), dtype=np.float64)
+        num_tiles = np.empty((num_games, num_candidates), dtype=np.int64)
+        num_tiles[:, :num_stacks] = total_height[:, None] - heights + new_heights
+        num_tiles[:, num_stacks] = total_height
+
+        features[:, :num_stacks, 0] = heights + 1 - new_heights
+        features[:, :num_stacks, 1] = np.maximum(largest_without, new_heights)
+        features[:, :num_stacks, 2] = np.minimum(np.minimum(lowest_without, new_heights), max_size)
+        features[:, :num_stacks, 4] = (total_discontinuities[:, None] - stack_discontinuities
+                                       + new_discontinuities)
+        features[:, :num_stacks, 5] = discards[:, None]
+
+        # Features of the discard pile candidate
+        features[:, num_stacks, 1] = largest[:, 0]
+        features[:, num_stacks, 2] = np.minimum(lowest[:, 0], max_size)
+        features[:, num_stacks, 4] = total_discontinuities
+        features[:, num_stacks, 5] = discards + 1
+        features[:, :, 3] = num_tiles / (num_stacks - 1)
+
+        # Add the weighted features up in the same order as DNA.evaluate so
+        # the evaluations, and therefore the ties, match GeneticBot exactly
+        evaluation = features[:, :, 0] * weights[:, None, 0]
+        for feature in range(1, len(FEATURE_WEIGHTS)):
+            evaluation = evaluation + features[:, :, feature] * weights[:, None, feature]
+
+        candidate_legal = np.empty((num_games, num_candidates), dtype=bool)
+        candidate_legal[:, :num_stacks] = legal
+        candidate_legal[:, num_stacks] = discards < self.max_discards
+        evaluation[~candidate_legal] = -np.inf
+
+        # GeneticBot takes the last of the best moves, so search from the end
+        choice = num_candidates - 1 - np.argmax(evaluation[:, ::-1], axis=1)
+        stack_choice = np.minimum(choice, num_stacks - 1)
+        rows = np.arange(num_games)
+        return (choice, new_heights[rows, stack_choice], top[rows, stack_choice],
+                gained[rows, stack_choice])
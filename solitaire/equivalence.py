@@ -0,0 +1,220 @@
+'''
+Seeded equivalence checks for the fast paths of the solitaire bots. Every
+check plays seeded games through the fast code and through a reference and
+compares the results, so an edit that changes a decision or a score fails
+here instead of silently changing how the bots play.
+
+    python equivalence.py
+
+The BasicBot check compares its choices, made through the top tile index
+and the cached stack worth, with the original scans over every stack, and
+checks the index and the worth against the tiles. The move check compares
+the features GeneticBot computes incrementally for every candidate move
+with a reference that makes the move on a copy of the model and measures
+it from scratch. The lockstep check compares the scores of the vectorized
+population evaluator with GeneticBot games played one after another and on
+a process pool.
+'''
+import os
+import random
+import sys
+from copy import deepcopy
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from game.game_config import GameConfig
+from ai_training.genetic_training import evaluate_genome
+from ai_training.vectorized_evaluation import LockstepEvaluator, dna_matrix, FEATURE_WEIGHTS
+from game.game_model import Stack
+from users.basic_bot import BasicBot
+from users.genetic_bot import DNA, GeneticBot
+
+
+def random_dna_params(rng):
+    return {name: rng.random() * 2 - 1 for name in FEATURE_WEIGHTS + ['fill_ratio_weight']}
+
+
+def reference_basic_pile(game_model):
+    '''
+    The pile BasicBot picks, found by scanning every stack and summing its
+    tiles, as BasicBot did before the top tile index.
+    '''
+    stacks = game_model.stacks
+
+    def lowest_bottom(value):
+        while value != 2048:
+            lowest_stacks = [stack for stack in stacks if len(stack) == 0 or stack.tile_values[-1] == value]
+            if len(lowest_stacks) > 0:
+                return lowest_stacks
+            value *= 2
+        return []
+
+    def extreme_worth(candidates, better):
+        chosen = None
+        for stack in candidates:
+            if not stack.is_full() and (chosen is None or better(sum(stack.tile_values), sum(chosen.tile_values))):
+                chosen = stack
+        return chosen
+
+    def lower(worth, other):
+        return worth < other
+
+    def higher(worth, other):
+        return worth > other
+
+    lowest_stacks = lowest_bottom(game_model.tile_queue.peak(0))
+    if len(lowest_stacks) == 0:
+        if not game_model.discard_pile.is_full():
+            return game_model.discard_pile
+        return extreme_worth(stacks, lower)
+    highest_stack = extreme_worth(lowest_stacks, higher)
+    if highest_stack is None:
+        return extreme_worth(stacks, higher)
+    return highest_stack
+
+
+def check_basic_bot(game_config, seeds):
+    '''
+    Play seeded BasicBot games and compare every choice with the reference,
+    along with the cached worth and the top tile index of every stack.
+    Returns a description of every mismatch found.
+    '''
+    failures = []
+    bot = BasicBot(game_config, {'game_display': False})
+    game_model = bot.game_model
+    for seed in seeds:
+        game_model.reset(seed)
+        while not game_model.game_over():
+            for stack in game_model.stacks:
+                top_tile = stack.tile_values[-1] if len(stack) > 0 else 0
+                if stack.worth != sum(stack.tile_values) or stack not in game_model.top_tile_index.get(top_tile):
+                    failures.append('stack cache out of date for {} in game {}'.format(stack, seed))
+            pile = bot.get_target_pile(None)
+            reference = reference_basic_pile(game_model)
+            if pile is not reference:
+                failures.append('BasicBot picked pile {} instead of {} in game {} at score {}'.format(
+                    pile.pile_id, reference.pile_id, seed, game_model.score))
+            if len(failures) > 0:
+                return failures
+            game_model.make_move(pile)
+    return failures
+
+
+# Features of a move compared between GeneticBot and the reference
+MOVE_FEATURES = ['num_merges', 'num_discontinuities', 'num_tiles', 'score_change', 'largest_height',
+                 'lowest_height', 'average_height', 'num_discards', 'fill_ratio']
+
+
+class ReferenceMove:
+    '''
+    Features of a move measured on a copy of the model after making it.
+    '''
+    def __init__(self, game_model, pile):
+        new_model = deepcopy(game_model)
+        new_pile = new_model.get_pile(pile.pile_id)
+        stack_move = isinstance(new_pile, Stack)
+        original_height = len(pile) if stack_move else 0
+        new_model.make_move(new_pile)
+        self.num_merges = 0
+        if stack_move:
+            new_height = len(new_pile)
+            if original_height != 0 and new_height == 0:
+                self.num_merges = original_height
+            else:
+                self.num_merges = original_height + 1 - new_height
+        stacks = new_model.stacks
+        heights = [len(stack) for stack in stacks]
+        self.num_discontinuities = sum(stack.tile_values[i] < stack.tile_values[i + 1]
+                                       for stack in stacks for i in range(len(stack) - 1))
+        self.num_tiles = sum(heights)
+        self.score_change = new_model.score - game_model.score
+        self.largest_height = max(heights)
+        self.lowest_height = min([stacks[1].max_size] + heights)
+        self.average_height = self.num_tiles / (len(stacks) - 1)
+        self.num_discards = new_model.discard_pile.num_discards
+        max_tiles = len(stacks) * stacks[0].max_size + new_model.discard_pile.max_discards
+        self.fill_ratio = self.num_tiles / max_tiles
+
+
+def check_genetic_moves(game_config, num_genomes, seeds, rng):
+    '''
+    Play seeded games with random genomes and compare the features of every
+    candidate move with the reference. Returns a description of every
+    mismatch found.
+    '''
+    failures = []
+    for _ in range(num_genomes):
+        bot = GeneticBot(game_config, {'game_display': False, 'dna_init': random_dna_params(rng)})
+        game_model = bot.game_model
+        for seed in seeds:
+            game_model.reset(seed)
+            while not game_model.game_over():
+                moves = bot.get_possible_moves()
+                for move in moves:
+                    reference = ReferenceMove(game_model, move.original_pile)
+                    for feature in MOVE_FEATURES:
+                        if getattr(move, feature) != getattr(reference, feature):
+                            failures.append('{} {} != {} moving to pile {} in game {} at score {}'.format(
+                                feature, getattr(move, feature), getattr(reference, feature),
+                                move.original_pile.pile_id, seed, game_model.score))
+                if len(failures) > 0:
+                    return failures
+                game_model.make_move(bot.get_target_pile(None))
+    return failures
+
+
+def check_lockstep(game_config, num_genomes, seeds, rng, num_workers=2):
+    '''
+    Compare the lockstep scores with serial and process pool GeneticBot
+    games. Returns a description of every mismatch found.
+    '''
+    failures = []
+    dna_params = [random_dna_params(rng) for _ in range(num_genomes)]
+    serial = [evaluate_genome(game_config, params, seeds, 'mean')[0].scores for params in dna_params]
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        results = executor.map(evaluate_genome, [game_config] * num_genomes, dna_params,
+                               [seeds] * num_genomes, ['mean'] * num_genomes)
+        pooled = [fitness_stats.scores for fitness_stats, _, _ in results]
+    # Serial training evaluates bots that already exist and leaves the
+    # global random state alone, so the lockstep evaluator must too or the
+    # next generation is bred differently
+    random_state = random.getstate()
+    lockstep, _ = LockstepEvaluator(game_config).evaluate(
+        dna_matrix([DNA(params) for params in dna_params]), seeds)
+    if random.getstate() != random_state:
+        failures.append('lockstep evaluation changed the global random state')
+    for genome, params in enumerate(dna_params):
+        if pooled[genome] != serial[genome]:
+            failures.append('pool scores {} != serial {} for {}'.format(pooled[genome], serial[genome], params))
+        if lockstep[genome].tolist() != serial[genome]:
+            failures.append('lockstep scores {} != serial {} for {}'.format(
+                lockstep[genome].tolist(), serial[genome], params))
+    return failures
+
+
+def main():
+    parser = ArgumentParser(description='Cross check the fast paths of the solitaire bots.')
+    parser.add_argument('--games', type=int, default=5, help='Number of seeded games per check')
+    parser.add_argument('--genomes', type=int, default=12, help='Number of random genomes to cross check')
+    parser.add_argument('--move-genomes', type=int, default=2, help='Number of genomes to check the moves of')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    current_dir = Path(os.path.dirname(os.path.abspath(__file__)))
+    game_config = GameConfig.get(current_dir / 'resources' / 'config' / 'base_config.ini')
+    rng = random.Random(args.seed)
+    seeds = [rng.randrange(2 ** 32) for _ in range(args.games)]
+
+    failures = check_basic_bot(game_config, seeds)
+    failures += check_genetic_moves(game_config, args.move_genomes, seeds, rng)
+    failures += check_lockstep(game_config, args.genomes, seeds, rng)
+    for failure in failures[:20]:
+        print('Mismatch: ' + failure)
+    if len(failures) > 0:
+        print('{} mismatches found'.format(len(failures)))
+        sys.exit(1)
+    print('All fast paths match their reference on {} games'.format(args.games))
+
+
+if __name__ == '__main__':
+    main()
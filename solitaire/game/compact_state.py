@@ -0,0 +1,91 @@
+import struct
+import numpy as np
+from game.game_model import GameModel
+
+
+class CompactState:
+    """
+    Compact, hashable snapshot of a GameModel. Tiles are stored as the log2
+    of their value in a fixed (num_stacks, max_stack_size) uint8 array next
+    to a vector of stack heights, so a state takes a few dozen bytes and
+    pickles to the same bytes as to_bytes.
+    """
+    HEADER = struct.Struct('<BBBBQB')
+
+    __slots__ = ('tiles', 'heights', 'num_discards', 'max_discards', 'queue', 'score')
+
+    def __init__(self, tiles, heights, num_discards, max_discards, queue, score):
+        self.tiles = tiles
+        self.heights = heights
+        self.num_discards = num_discards
+        self.max_discards = max_discards
+        self.queue = queue
+        self.score = score
+
+    @staticmethod
+    def from_model(game_model):
+        num_stacks = len(game_model.stacks)
+        max_stack_size = game_model.stacks[0].max_size
+        tiles = np.zeros((num_stacks, max_stack_size), dtype=np.uint8)
+        heights = np.zeros(num_stacks, dtype=np.uint8)
+        for i, stack in enumerate(game_model.stacks):
+            heights[i] = len(stack)
+            for j, tile_value in enumerate(stack.tile_values):
+                tiles[i, j] = tile_value.bit_length() - 1
+        queue = tuple(tile_value.bit_length() - 1 for tile_value in game_model.tile_queue.tile_values)
+        discard_pile = game_model.discard_pile
+        return CompactState(tiles, heights, discard_pile.num_discards, discard_pile.max_discards,
+                            queue, game_model.score)
+
+    def apply_to(self, game_model):
+        """
+        Overwrite the state of an existing GameModel with this state, so
+        views and bots holding on to the model see the new state.
+        """
+        for i, stack in enumerate(game_model.stacks):
+            stack.set_tiles([1 << int(exponent) for exponent in self.tiles[i, :self.heights[i]]])
+        game_model.discard_pile.num_discards = self.num_discards
+        game_model.discard_pile.max_discards = self.max_discards
+        game_model.tile_queue.tile_values = [1 << exponent for exponent in self.queue]
+        game_model.score = self.score
+
+    def to_model(self, game_config):
+        game_model = GameModel(game_config)
+        self.apply_to(game_model)
+        return game_model
+
+    def copy(self):
+        return CompactState(self.tiles.copy(), self.heights.copy(), self.num_discards, self.max_discards,
+                            self.queue, self.score)
+
+    def to_bytes(self):
+        num_stacks, max_stack_size = self.tiles.shape
+        header = CompactState.HEADER.pack(num_stacks, max_stack_size, self.num_discards, self.max_discards,
+                                          self.score, len(self.queue))
+        return header + bytes(self.queue) + self.heights.tobytes() + self.tiles.tobytes()
+
+    @staticmethod
+    def from_bytes(data):
+        header_size = CompactState.HEADER.size
+        num_stacks, max_stack_size, num_discards, max_discards, score, queue_length = \
+            CompactState.HEADER.unpack_from(data)
+        offset = header_size
+        queue = tuple(data[offset:offset + queue_length])
+        offset += queue_length
+        heights = np.frombuffer(data, dtype=np.uint8, count=num_stacks, offset=offset).copy()
+        offset += num_stacks
+        tiles = np.frombuffer(data, dtype=np.uint8, count=num_stacks * max_stack_size, offset=offset)
+        tiles = tiles.reshape(num_stacks, max_stack_size).copy()
+        return CompactState(tiles, heights, num_discards, max_discards, queue, score)
+
+    def __reduce__(self):
+        return CompactState.from_bytes, (self.to_bytes(),)
+
+    def __hash__(self):
+        return hash(self.to_bytes())
+
+    def __eq__(self, other):
+        return isinstance(other, CompactState) and self.to_bytes() == other.to_bytes()
+
+    def __str__(self):
+        return 'CompactState: ' + str(self.score)
@@ -0,0 +1,54 @@
+from collections import namedtuple
+from configparser import ConfigParser
+from functools import lru_cache
+
+
+def parse_pair(value):
+    raw_values = value.split(',')
+    return int(raw_values[0]), int(raw_values[1])
+
+
+class GameConfig(namedtuple('GameConfig', [
+        'num_stacks', 'max_stack_size', 'refresh_time', 'font_name', 'font_size', 'screen_dim',
+        'discard_pile_pos', 'discard_pile_dim', 'tile_queue_pos', 'score_display_pos', 'tile_dim',
+        'stack_start_pos'])):
+    """
+    Parsed, immutable game config. It is read once and handed to the user,
+    controller, model and view instead of every one of them parsing the INI
+    file again. Being a tuple it is also cheap to send to worker processes.
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def read(config_path):
+        config = ConfigParser()
+        config.read(config_path)
+        view = config['view']
+        return GameConfig(
+            num_stacks=int(config['model']['num_stacks']),
+            max_stack_size=int(config['model']['max_stack_size']),
+            refresh_time=float(config['user']['refresh_time']),
+            font_name=view['font_name'],
+            font_size=int(view['font_size']),
+            screen_dim=parse_pair(view['screen_dim']),
+            discard_pile_pos=parse_pair(view['discard_pile_pos']),
+            discard_pile_dim=parse_pair(view['discard_pile_dim']),
+            tile_queue_pos=parse_pair(view['tile_queue_pos']),
+            score_display_pos=parse_pair(view['score_display_pos']),
+            tile_dim=parse_pair(view['tile_dim']),
+            stack_start_pos=parse_pair(view['stack_start_pos']))
+
+    @staticmethod
+    def get(game_config):
+        """
+        Return the given config, or the config of the given path, parsing
+        every path only once per process.
+        """
+        if isinstance(game_config, GameConfig):
+            return game_config
+        return _read_cached(str(game_config))
+
+
+@lru_cache(maxsize=None)
+def _read_cached(config_path):
+    return GameConfig.read(config_path)
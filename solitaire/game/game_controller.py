@@ -1,6 +1,5 @@
-from game.game_view import GameView
+from game.game_config import GameConfig
 from game.game_model import GameModel, DiscardPile
-import pygame
 
 
 class InvalidMoveException(Exception):
@@ -14,14 +13,16 @@ class DisplayNotInitializedException(Exception):
 
 
 class GameController:
-    def __init__(self, game_config_path, params):
-        self.game_config_path = game_config_path
+    def __init__(self, game_config, params):
+        self.game_config = GameConfig.get(game_config)
         self.display_game = True
-        self.game_model = GameModel(game_config_path)
+        self.game_model = GameModel(self.game_config, params.get('seed'))
         if 'game_display' in params:
             self.display_game = params['game_display']
         if self.display_game:
-            self.game_view = GameView(game_config_path)
+            # pygame is only imported once a game is actually displayed
+            from game.game_view import GameView
+            self.game_view = GameView(self.game_config)
             self.game_view.draw(self.game_model)
 
     def validate_move(self, pile):
@@ -34,9 +35,18 @@ class GameController:
                 raise InvalidMoveException('Stack full and next tile does not match top tile')
 
     def make_move(self, pile):
+        self.apply_move(pile)
+        self.draw()
+
+    def apply_move(self, pile):
+        """
+        Validate and make the move on the model without drawing it.
+        """
         self.validate_move(pile)
         target_pile = self.game_model.get_pile(pile.pile_id)
         self.game_model.make_move(target_pile)
+
+    def draw(self):
         if self.display_game:
             self.game_view.draw(self.game_model)
 
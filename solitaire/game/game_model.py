@@ -1,6 +1,6 @@
 import abc
-from random import randint
-from configparser import ConfigParser
+import random
+from game.game_config import GameConfig
 
 
 class Pile(abc.ABC):
@@ -13,48 +13,134 @@ class Pile(abc.ABC):
         pass
 
 
+def merge_tiles(tile_values, multiplier=1):
+    """
+    Merge the equal tiles on top of the tile values, in place, and return
+    the points scored. Every merge scores the merged tile times the
+    multiplier, which goes up by one with each merge in a row.
+    """
+    score = 0
+    while len(tile_values) >= 2 and tile_values[-1] == tile_values[-2]:
+        result = tile_values.pop() + tile_values.pop()
+        tile_values.append(result)
+        score += result * multiplier
+        multiplier += 1
+    return score
+
+
+def add_tile_values(tile_values, tile_value):
+    """
+    Return the tile values, as a new list, and the points scored after
+    placing the tile on a stack with the given tile values.
+    """
+    tile_values = list(tile_values)
+    tile_values.append(tile_value)
+    return tile_values, merge_tiles(tile_values)
+
+
 class Stack(Pile):
-    def __init__(self, max_size, pile_id):
+    def __init__(self, max_size, pile_id, top_tile_index=None):
         self.tile_values = []
+        self.worth = 0
         self.max_size = max_size
         self.pile_id = pile_id
+        self.top_tile_index = top_tile_index
+        if top_tile_index is not None:
+            top_tile_index.add(self, 0)
+
+    def top_tile(self):
+        """
+        Value of the top tile, 0 for an empty stack.
+        """
+        if len(self.tile_values) == 0:
+            return 0
+        return self.tile_values[-1]
 
     def merge(self, multiplier):
-        if len(self.tile_values) < 2 or not self.tile_values[-1] == self.tile_values[-2]:
-            return 0
-        result = self.tile_values.pop() + self.tile_values.pop()
-        self.tile_values.append(result)
-        return result * multiplier + self.merge(multiplier + 1)
+        return merge_tiles(self.tile_values, multiplier)
+
+    def preview_add_tile(self, tile_value):
+        """
+        Return the tile values and the score that add_tile would produce,
+        without changing the stack.
+        """
+        return add_tile_values(self.tile_values, tile_value)
 
     def add_tile(self, tile_value):
-        self.tile_values.append(tile_value)
+        tile_values = self.tile_values
+        old_top_tile = tile_values[-1] if len(tile_values) > 0 else 0
+        tile_values.append(tile_value)
+        # Merging keeps the sum of the tiles, so only the new tile adds worth
+        self.worth += tile_value
         score = self.merge(1)
         if self.tile_values[0] == 2048:
             self.tiles = []
+        if self.top_tile_index is not None:
+            self.top_tile_index.move(self, old_top_tile, tile_values[-1])
         return score
 
+    def set_tiles(self, tile_values):
+        """
+        Replace the tiles of the stack. The tile values must only be changed
+        through add_tile and set_tiles, so the worth and the top tile index
+        stay up to date.
+        """
+        old_top_tile = self.top_tile()
+        self.tile_values = list(tile_values)
+        self.worth = sum(self.tile_values)
+        if self.top_tile_index is not None:
+            self.top_tile_index.move(self, old_top_tile, self.top_tile())
+
     def is_full(self):
         return len(self.tile_values) == self.max_size
 
     def get_worth(self):
-        return sum(self.tile_values)
+        return self.worth
 
     def __len__(self):
         return len(self.tile_values)
 
     def __lt__(self, other):
-        return self.get_worth() < other.get_worth()
+        return self.worth < other.worth
 
     def __gt__(self, other):
-        return self.get_worth() > other.get_worth()
+        return self.worth > other.worth
 
     def __eq__(self, other):
         return self.pile_id == other.pile_id
 
+    def __hash__(self):
+        return self.pile_id
+
     def __str__(self):
         return 'Stack with tiles: ' + str(self.tile_values)
 
 
+class TopTileIndex:
+    """
+    Stacks of a game by the value of their top tile, kept up to date by the
+    stacks as tiles are added. Empty stacks are kept under 0.
+    """
+    def __init__(self):
+        self.stacks = dict()
+
+    def add(self, stack, top_tile):
+        if top_tile not in self.stacks:
+            self.stacks[top_tile] = set()
+        self.stacks[top_tile].add(stack)
+
+    def move(self, stack, old_top_tile, new_top_tile):
+        if old_top_tile != new_top_tile:
+            self.stacks[old_top_tile].discard(stack)
+            self.add(stack, new_top_tile)
+
+    def get(self, top_tile):
+        return self.stacks.get(top_tile, EMPTY_SET)
+
+
+EMPTY_SET = frozenset()
+
+
 class DiscardPile(Pile):
     def __init__(self, pile_id, max_discards=2):
         self.max_discards = max_discards
@@ -75,11 +161,14 @@ class DiscardPile(Pile):
 
 
 class TileQueue:
-    def __init__(self):
+    def __init__(self, seed=None):
+        # A seeded queue draws from its own generator so the tile sequence
+        # only depends on the seed. Otherwise the global generator is used.
+        self.rng = random if seed is None else random.Random(seed)
         self.tile_values = [self.generate_tile_value(), self.generate_tile_value()]
 
     def generate_tile_value(self):
-        prob = randint(1, 6)
+        prob = self.rng.randint(1, 6)
         return pow(2, prob)
 
     def pull(self):
@@ -95,23 +184,31 @@ class TileQueue:
 
 
 class GameModel:
-    def __init__(self, game_config_path):
-        config = ConfigParser()
-        config.read(game_config_path)
-        self.init_stacks(config)
+    def __init__(self, game_config, seed=None):
+        self.init_stacks(GameConfig.get(game_config))
         self.discard_pile = DiscardPile(len(self.stacks))
-        self.tile_queue = TileQueue()
+        self.tile_queue = TileQueue(seed)
+        self.score = 0
+
+    def reset(self, seed=None):
+        """
+        Start a new game in place, keeping the same model object so anything
+        holding on to it (controller, view, bots) sees the new game.
+        """
+        for stack in self.stacks:
+            stack.set_tiles([])
+        self.discard_pile.clear_discards()
+        self.tile_queue = TileQueue(seed)
         self.score = 0
 
     def init_stacks(self, config):
-        num_stacks = int(config['model']['num_stacks'])
-        max_stack_size = int(config['model']['max_stack_size'])
-        self.stacks = [Stack(max_stack_size, i) for i in range(0, num_stacks)]
+        self.top_tile_index = TopTileIndex()
+        self.stacks = [Stack(config.max_stack_size, i, self.top_tile_index) for i in range(0, config.num_stacks)]
 
     def get_pile(self, pile_id):
-        for stack in self.stacks:
-            if pile_id == stack.pile_id:
-                return stack
+        # Stack ids are their index, any other id is the discard pile
+        if 0 <= pile_id < len(self.stacks):
+            return self.stacks[pile_id]
         return self.discard_pile
 
     def make_move(self, pile):
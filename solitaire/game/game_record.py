@@ -0,0 +1,168 @@
+'''
+Recording and replay of solitaire games. The tiles of a seeded game only
+depend on its seed, so a game is stored as the seed, the final score and
+the id of the pile every tile went to, one byte per move. Games are
+appended to a binary log, and can be replayed headless on a GameModel or
+stepped through in the GameView.
+'''
+import os
+import struct
+import zlib
+from time import sleep
+from game.game_config import GameConfig
+from game.game_model import GameModel
+
+
+class GameRecord:
+    def __init__(self, seed, moves=None, score=0):
+        if seed is None or not 0 <= seed < 2 ** 64:
+            raise ValueError('Only games with a seed from 0 to 2^64 - 1 can be recorded')
+        self.seed = seed
+        self.moves = bytearray() if moves is None else bytearray(moves)
+        self.score = score
+
+    def add_move(self, pile):
+        self.moves.append(pile.pile_id)
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __str__(self):
+        return 'GameRecord: seed {} score {} in {} moves'.format(self.seed, self.score, len(self.moves))
+
+
+class GameLog:
+    '''
+    Append-only file of game records. Every record is a seed, score and
+    move count header, the moves and a CRC32 of both. A record cut short by
+    a crash is ignored, and dropped before anything else is appended.
+    '''
+    HEADER = struct.Struct('<QQI')
+    CHECKSUM = struct.Struct('<I')
+
+    def __init__(self, path):
+        self.path = path
+        self.tail_checked = False
+
+    def append(self, records):
+        '''
+        Append a record or a list of records in a single write.
+        '''
+        if isinstance(records, GameRecord):
+            records = [records]
+        chunks = []
+        for record in records:
+            data = GameLog.HEADER.pack(record.seed, record.score, len(record.moves)) + bytes(record.moves)
+            chunks.append(data)
+            chunks.append(GameLog.CHECKSUM.pack(zlib.crc32(data)))
+        if not self.tail_checked and os.path.exists(self.path):
+            valid_length = self.valid_length()
+            if os.path.getsize(self.path) != valid_length:
+                os.truncate(self.path, valid_length)
+        self.tail_checked = True
+        with open(self.path, 'ab') as log_file:
+            log_file.write(b''.join(chunks))
+
+    def records(self):
+        '''
+        Yield every complete record in the file, one at a time.
+        '''
+        for record, _ in self.records_with_offsets():
+            yield record
+
+    def records_with_offsets(self):
+        if not os.path.exists(self.path):
+            return
+        header_size = GameLog.HEADER.size
+        checksum_size = GameLog.CHECKSUM.size
+        with open(self.path, 'rb') as log_file:
+            offset = 0
+            while True:
+                header = log_file.read(header_size)
+                if len(header) < header_size:
+                    return
+                seed, score, num_moves = GameLog.HEADER.unpack(header)
+                body = log_file.read(num_moves + checksum_size)
+                if len(body) < num_moves + checksum_size:
+                    return
+                moves = body[:num_moves]
+                checksum, = GameLog.CHECKSUM.unpack_from(body, num_moves)
+                if zlib.crc32(header + moves) != checksum:
+                    return
+                offset += header_size + num_moves + checksum_size
+                yield GameRecord(seed, moves, score), offset
+
+    def headers(self):
+        '''
+        Yield the seed, score and number of moves of every record, skipping
+        over the moves without reading them. Meant for stats over large
+        logs, so the checksums are not verified.
+        '''
+        if not os.path.exists(self.path):
+            return
+        file_size = os.path.getsize(self.path)
+        header_size = GameLog.HEADER.size
+        with open(self.path, 'rb') as log_file:
+            offset = 0
+            while offset + header_size <= file_size:
+                seed, score, num_moves = GameLog.HEADER.unpack(log_file.read(header_size))
+                offset += header_size + num_moves + GameLog.CHECKSUM.size
+                if offset > file_size:
+                    return
+                log_file.seek(offset)
+                yield seed, score, num_moves
+
+    def valid_length(self):
+        length = 0
+        for _, offset in self.records_with_offsets():
+            length = offset
+        return length
+
+
+def replay_states(game_config, record, game_model=None):
+    '''
+    Replay a record headless, yielding the model after every move. The same
+    model is changed in place, so copy it (with CompactState for example)
+    to keep a state around.
+    '''
+    if game_model is None:
+        game_model = GameModel(GameConfig.get(game_config))
+    game_model.reset(record.seed)
+    yield game_model
+    get_pile = game_model.get_pile
+    make_move = game_model.make_move
+    for pile_id in record.moves:
+        make_move(get_pile(pile_id))
+        yield game_model
+
+
+def replay(game_config, record, game_model=None):
+    '''
+    Replay a record headless at engine speed and return the final model.
+    Raises a ValueError if the replay does not reach the recorded score.
+    '''
+    if game_model is None:
+        game_model = GameModel(GameConfig.get(game_config))
+    game_model.reset(record.seed)
+    get_pile = game_model.get_pile
+    make_move = game_model.make_move
+    for pile_id in record.moves:
+        make_move(get_pile(pile_id))
+    if game_model.score != record.score:
+        raise ValueError('Replay of seed {} scored {} instead of {}'.format(
+            record.seed, game_model.score, record.score))
+    return game_model
+
+
+def show_replay(game_config, record, move_time=0.5):
+    '''
+    Step through a record in the GameView, one move every move_time seconds.
+    '''
+    from game.game_controller import GameController
+    game_controller = GameController(game_config, {'game_display': True, 'seed': record.seed})
+    game_view = game_controller.game_view
+    for game_model in replay_states(game_config, record, game_controller.game_model):
+        game_view.draw(game_model)
+        game_view.get_events()
+        sleep(move_time)
+    return game_controller.game_model
@@ -1,8 +1,8 @@
 from pathlib import Path
 import os
 import pygame
-from configparser import ConfigParser
 from enum import Enum
+from game.game_config import GameConfig, parse_pair
 
 
 class Color(Enum):
@@ -34,8 +34,7 @@ class TileView:
 class GameView:
     @staticmethod
     def parse_pair(value):
-        raw_values = value.split(',')
-        return int(raw_values[0]), int(raw_values[1])
+        return parse_pair(value)
 
     @staticmethod
     def generate_tile_views(tile_dimensions):
@@ -47,39 +46,34 @@ class GameView:
             tile_views[tile_value] = TileView(tile_value, height, width)
         return tile_views
 
-    def __init__(self, view_config_path):
-        config = ConfigParser()
-        config.read(view_config_path)
+    def __init__(self, game_config):
+        config = GameConfig.get(game_config)
         pygame.init()
         pygame.font.init()
         self.init_font(config)
         self.init_screen(config)
         self.init_tiles(config)
         self.init_stack_positions(config)
-        self.discard_pile_pos = GameView.parse_pair(config['view']['discard_pile_pos'])
-        self.discard_pile_dim = GameView.parse_pair(config['view']['discard_pile_dim'])
-        self.tile_queue_pos = GameView.parse_pair(config['view']['tile_queue_pos'])
-        self.score_pos = GameView.parse_pair(config['view']['score_display_pos'])
+        self.discard_pile_pos = config.discard_pile_pos
+        self.discard_pile_dim = config.discard_pile_dim
+        self.tile_queue_pos = config.tile_queue_pos
+        self.score_pos = config.score_display_pos
 
     def init_font(self, config):
-        font_name = config['view']['font_name']
-        font_size = int(config['view']['font_size'])
-        self.font = pygame.font.SysFont(font_name, font_size)
+        self.font = pygame.font.SysFont(config.font_name, config.font_size)
 
     def init_screen(self, config):
-        self.screen_size = GameView.parse_pair(config['view']['screen_dim'])
+        self.screen_size = config.screen_dim
         self.screen = pygame.display.set_mode(self.screen_size)
 
     def init_tiles(self, config):
-        tile_dimensions = GameView.parse_pair(config['view']['tile_dim'])
-        self.tile_views = GameView.generate_tile_views(tile_dimensions)
+        self.tile_views = GameView.generate_tile_views(config.tile_dim)
 
     def init_stack_positions(self, config):
         self.stack_positions = []
-        num_stacks = int(config['model']['num_stacks'])
-        stack_spacing = self.screen_size[0] // num_stacks
-        start_pos = GameView.parse_pair(config['view']['stack_start_pos'])
-        for i in range(0, num_stacks):
+        stack_spacing = self.screen_size[0] // config.num_stacks
+        start_pos = config.stack_start_pos
+        for i in range(0, config.num_stacks):
             stack_pos = (start_pos[0] + stack_spacing * i, start_pos[1])
             self.stack_positions.append(stack_pos)
 
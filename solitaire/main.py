@@ -1,13 +1,69 @@
 import os
+import sys
+from argparse import ArgumentParser
 from pathlib import Path
 from users.genetic_bot import GeneticBot
 from users.basic_bot import BasicBot
-from users.human import Human
 from users.genetic_bot import GeneticBot
+from users.simulation_runner import SimulationRunner
+from game.game_record import GameLog, show_replay
+from users.tournament import Entrant, run_tournament, save_baseline, check_baseline
 from ai_training.genetic_training import training
 
 
+def parse_args():
+    parser = ArgumentParser(description='Play or train 2048 solitaire bots')
+    parser.add_argument('--train', action='store_true', help='Run genetic training')
+    parser.add_argument('--resume', action='store_true', help='Resume genetic training from the checkpoint')
+    parser.add_argument('--checkpoint', default='genetic_training.ckpt', help='Genetic training checkpoint log')
+    parser.add_argument('--simulate', type=int, metavar='GAMES', help='Play GAMES headless games with the bot')
+    parser.add_argument('--record', metavar='LOG', help='Append the simulated games to the game log LOG')
+    parser.add_argument('--replay', metavar='LOG', help='Show a game of the game log LOG')
+    parser.add_argument('--game', type=int, default=0, help='Index of the game to replay')
+    parser.add_argument('--tournament', type=int, metavar='GAMES', help='Play the bots over GAMES seeded games')
+    parser.add_argument('--bots', default='basic,genetic', help='Comma separated bots of the tournament: '
+                        'basic, genetic, search and mcts')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Tournament worker processes')
+    parser.add_argument('--chunk-size', type=int, help='Games per tournament task, '
+                        'by default the games are split evenly over the workers')
+    parser.add_argument('--baseline', metavar='JSON', help='Fail when the bots fall behind the baseline JSON')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the baseline JSON')
+    parser.add_argument('--score-threshold', type=float, default=0.05, help='Allowed drop of the mean score')
+    parser.add_argument('--speed-threshold', type=float, help='Allowed drop of the moves/s, '
+                        'not checked by default')
+    parser.add_argument('--stats', metavar='JSON', help='Time every phase of the game and write the stats to JSON')
+    args = parser.parse_args()
+    if args.save_baseline and args.baseline is None:
+        parser.error('--save-baseline needs --baseline JSON')
+    return args
+
+
+def tournament(args, config_path, dna):
+    from users.search_bot import SearchBot
+    from users.mcts_bot import MCTSBot
+    bots = {
+        'basic': Entrant('BasicBot', BasicBot),
+        'genetic': Entrant('GeneticBot', GeneticBot, {'dna_init': dna}),
+        'search': Entrant('SearchBot', SearchBot, {'search_depth': 2}),
+        'mcts': Entrant('MCTSBot', MCTSBot, {'rollouts': 100, 'search_seed': 0}),
+    }
+    entrants = [bots[name] for name in args.bots.split(',')]
+    results = run_tournament(config_path, entrants, range(args.tournament), args.workers,
+                             args.chunk_size)
+    if args.baseline is None:
+        return
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        return
+    failures = check_baseline(results, args.baseline, args.score_threshold, args.speed_threshold)
+    for failure in failures:
+        print('Regression: ' + failure)
+    if len(failures) > 0:
+        sys.exit(1)
+
+
 def main():
+    args = parse_args()
     current_dir = Path(os.path.dirname(os.path.abspath(__file__)))
     config_path = str(current_dir / 'resources' / 'config' / 'base_config.ini')
     params = dict()
@@ -21,12 +77,41 @@ def main():
         'fill_ratio_weight': -1.0833
     }
     params['game_display'] = True
+    if args.train or args.resume:
+        params['game_display'] = False
+        training(params, args.checkpoint, args.resume)
+        return
+    if args.simulate is not None:
+        params['game_display'] = False
+        user = BasicBot(config_path, params)
+        game_log = GameLog(args.record) if args.record is not None else None
+        print(SimulationRunner(user, game_log).run(range(args.simulate)))
+        return
+    if args.tournament is not None:
+        tournament(args, config_path, dna)
+        return
+    if args.replay is not None:
+        for index, record in enumerate(GameLog(args.replay).records()):
+            if index == args.game:
+                print(record)
+                show_replay(config_path, record)
+                return
+        print('No game {} in {}'.format(args.game, args.replay))
+        return
     # params['dna_init'] = dna
+    params['instrument'] = args.stats is not None
     user = BasicBot(config_path, params)
+    # from users.human import Human
     # user = Human(config_path)
     # user = GeneticBot(config_path, params)
+    # from users.search_bot import SearchBot
+    # user = SearchBot(config_path, dict(params, search_depth=3, search_time=0.05))
+    # from users.mcts_bot import MCTSBot
+    # user = MCTSBot(config_path, dict(params, move_time=0.1, num_workers=os.cpu_count()))
     user.run()
     print(user.user_stats.user_score)
+    if args.stats is not None:
+        user.user_stats.to_json(args.stats)
     # training(params)
 
 
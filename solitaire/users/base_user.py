@@ -1,10 +1,60 @@
 from abc import ABC, abstractmethod
 from game.game_controller import GameController
-from configparser import ConfigParser
-from time import time, sleep
+from game.game_config import GameConfig
+from time import time, sleep, perf_counter
+import json
+
+
+class PhaseStats:
+    """
+    Latencies, in seconds, of one phase of the game loop.
+    """
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self):
+        self.latencies = []
+
+    def add(self, latency):
+        self.latencies.append(latency)
+
+    def percentile(self, percent):
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+    def histogram(self):
+        """
+        Count of the latencies in power of two bins of microseconds. The key
+        is the upper end of the bin.
+        """
+        bins = dict()
+        for latency in self.latencies:
+            upper = 1
+            while upper < latency * 1e6:
+                upper *= 2
+            bins[upper] = bins.get(upper, 0) + 1
+        return {str(upper) + 'us': bins[upper] for upper in sorted(bins)}
+
+    def to_dict(self):
+        if len(self.latencies) == 0:
+            return {'count': 0}
+        total = sum(self.latencies)
+        summary = {
+            'count': len(self.latencies),
+            'total': total,
+            'mean': total / len(self.latencies),
+            'max': max(self.latencies),
+        }
+        for percent in PhaseStats.PERCENTILES:
+            summary['p' + str(percent)] = self.percentile(percent)
+        summary['histogram'] = self.histogram()
+        return summary
 
 
 class UserStats:
+    # Phases of the game loop timed when the user is instrumented
+    PHASES = ('events', 'decision', 'move', 'render')
+
     def __init__(self, user_type):
         self.moves_made = 0
         self.user_type = user_type
@@ -12,6 +62,8 @@ class UserStats:
         self.start_time = 0
         self.end_time = 0
         self.time_taken = 0
+        self.phase_stats = None
+        self.profile = None
 
     def start(self):
         self.start_time = time()
@@ -20,14 +72,45 @@ class UserStats:
         self.end_time = time()
         self.time_taken = self.end_time - self.start_time
 
+    def start_phases(self):
+        self.phase_stats = {phase: PhaseStats() for phase in UserStats.PHASES}
+
+    def to_dict(self):
+        stats = {
+            'user_type': self.user_type,
+            'user_score': self.user_score,
+            'moves_made': self.moves_made,
+            'time_taken': self.time_taken,
+        }
+        if self.phase_stats is not None:
+            stats['phases'] = {phase: phase_stats.to_dict() for phase, phase_stats in self.phase_stats.items()}
+        return stats
+
+    def to_json(self, path=None):
+        """
+        Return the stats as JSON, also writing them to the path if given.
+        """
+        data = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as json_file:
+                json_file.write(data)
+        return data
+
 
 class User(ABC):
+    """
+    Base of the players. The params can turn on 'instrument', to time every
+    phase of the game loop into the user stats, and 'profile', to run the
+    game under cProfile, or under any given profiler object with enable and
+    disable methods. The profiler is kept in user_stats.profile.
+    """
     def __init__(self, config_path, params, user_type):
-        config = ConfigParser()
-        config.read(config_path)
-        self.refresh_time = float(config['user']['refresh_time'])
-        self.game_controller = GameController(config_path, params)
+        config = GameConfig.get(config_path)
+        self.refresh_time = config.refresh_time
+        self.game_controller = GameController(config, params)
         self.user_stats = UserStats(user_type)
+        self.instrument = params.get('instrument', False)
+        self.profiler = params.get('profile')
 
     @abstractmethod
     def get_target_pile(self, events):
@@ -38,8 +121,30 @@ class User(ABC):
         pass
 
     def run(self):
-        running = True
+        profiler = self.start_profiler()
         self.user_stats.start()
+        if self.instrument:
+            self.run_instrumented()
+        else:
+            self.run_loop()
+        self.user_stats.user_score = self.game_controller.game_model.score
+        self.user_stats.finish()
+        if profiler is not None:
+            profiler.disable()
+            self.user_stats.profile = profiler
+
+    def start_profiler(self):
+        if not self.profiler:
+            return None
+        profiler = self.profiler
+        if profiler is True or profiler == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def run_loop(self):
+        running = True
         while running:
             events = None
             if self.game_controller.display_game:
@@ -50,5 +155,37 @@ class User(ABC):
                 self.user_stats.moves_made += 1
             running = self.is_running()
             sleep(self.refresh_time)
-        self.user_stats.user_score = self.game_controller.game_model.score
-        self.user_stats.finish()
+
+    def run_instrumented(self):
+        """
+        The game loop of run_loop, timing the event polling, the decision,
+        the move and the rendering separately.
+        """
+        self.user_stats.start_phases()
+        phase_stats = self.user_stats.phase_stats
+        add_events = phase_stats['events'].add
+        add_decision = phase_stats['decision'].add
+        add_move = phase_stats['move'].add
+        add_render = phase_stats['render'].add
+        game_controller = self.game_controller
+        running = True
+        while running:
+            events = None
+            if game_controller.display_game:
+                start = perf_counter()
+                events = game_controller.get_events()
+                add_events(perf_counter() - start)
+            start = perf_counter()
+            target_pile = self.get_target_pile(events)
+            add_decision(perf_counter() - start)
+            if target_pile is not None:
+                start = perf_counter()
+                game_controller.apply_move(target_pile)
+                add_move(perf_counter() - start)
+                if game_controller.display_game:
+                    start = perf_counter()
+                    game_controller.draw()
+                    add_render(perf_counter() - start)
+                self.user_stats.moves_made += 1
+            running = self.is_running()
+            sleep(self.refresh_time)
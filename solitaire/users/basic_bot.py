@@ -14,29 +14,35 @@ class BasicBot(User):
         self.game_model = self.game_controller.game_model
 
     def get_lowest_bottom(self, value: int) -> list:
-        if value == 2048:
-            return []
-        lowest_stacks = []
-        for stack in self.game_model.stacks:
-            if len(stack) == 0 or stack.tile_values[-1] == value:
-                lowest_stacks.append(stack)
-        if len(lowest_stacks) == 0:
-            return self.get_lowest_bottom(value * 2)
-        return lowest_stacks
+        top_tile_index = self.game_model.top_tile_index
+        empty_stacks = top_tile_index.get(0)
+        if len(empty_stacks) > 0:
+            return list(empty_stacks | top_tile_index.get(value))
+        while value != 2048:
+            lowest_stacks = top_tile_index.get(value)
+            if len(lowest_stacks) > 0:
+                return list(lowest_stacks)
+            value *= 2
+        return []
 
     def get_lowest_score(self, stacks: list) -> int:
+        # Ties go to the stack with the lowest id, as if scanned in order
         lowest_stack = None
         for stack in stacks:
-            is_lower_worth = lowest_stack is None or stack.get_worth() < lowest_stack.get_worth()
-            if not stack.is_full() and is_lower_worth:
+            if stack.is_full():
+                continue
+            if (lowest_stack is None or stack.worth < lowest_stack.worth
+                    or (stack.worth == lowest_stack.worth and stack.pile_id < lowest_stack.pile_id)):
                 lowest_stack = stack
         return lowest_stack
 
     def get_highest_score(self, stacks: list):
         highest_stack = None
         for stack in stacks:
-            is_higher_worth = highest_stack is None or stack.get_worth() > highest_stack.get_worth()
-            if not stack.is_full() and (highest_stack is None or is_higher_worth):
+            if stack.is_full():
+                continue
+            if (highest_stack is None or stack.worth > highest_stack.worth
+                    or (stack.worth == highest_stack.worth and stack.pile_id < highest_stack.pile_id)):
                 highest_stack = stack
         return highest_stack
 
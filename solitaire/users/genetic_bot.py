@@ -1,6 +1,8 @@
 from random import random
-from users.base_user import User
-from copy import deepcopy
+from math import sqrt
+from statistics import mean, stdev
+from users.base_user import User, UserStats
+from users.simulation_runner import SimulationRunner
 from game.game_model import Stack
 
 
@@ -40,29 +42,123 @@ class DNA:
         return str(self.__dict__)
 
 
+class FitnessStats:
+    """
+    Scores of a genome over several games. The fitness is the aggregate of
+    the scores: 'mean', 'median' or a quantile written as 'q' followed by
+    the fraction, like 'q0.25'.
+    """
+    def __init__(self, scores, aggregate='mean'):
+        self.scores = scores
+        self.aggregate = aggregate
+        self.mean = mean(scores)
+        # Half width of the normal approximation 95% confidence interval
+        self.confidence_interval = 0
+        if len(scores) > 1:
+            self.confidence_interval = 1.96 * stdev(scores) / sqrt(len(scores))
+        self.fitness = FitnessStats.aggregate_scores(scores, aggregate)
+
+    @staticmethod
+    def aggregate_scores(scores, aggregate):
+        if aggregate == 'mean':
+            return mean(scores)
+        if aggregate == 'median':
+            return FitnessStats.quantile(scores, 0.5)
+        if aggregate.startswith('q'):
+            return FitnessStats.quantile(scores, float(aggregate[1:]))
+        raise ValueError('Unknown fitness aggregate: ' + aggregate)
+
+    @staticmethod
+    def quantile(scores, fraction):
+        ordered = sorted(scores)
+        position = fraction * (len(ordered) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+    def __str__(self):
+        return 'Fitness: {} Mean: {:.1f} +/- {:.1f} over {} games'.format(
+            self.fitness, self.mean, self.confidence_interval, len(self.scores))
+
+
+class StackSummary:
+    """
+    Aggregates of the stacks of a game model, computed once per decision so
+    every candidate move can be evaluated as a change to a single stack.
+    """
+    def __init__(self, game_model):
+        self.stacks = game_model.stacks
+        self.heights = [len(stack) for stack in self.stacks]
+        # prefix_discontinuities[i][j] is the number of discontinuities among
+        # the bottom j + 1 tiles of stack i
+        self.prefix_discontinuities = []
+        for stack in self.stacks:
+            prefix = [0]
+            for j in range(1, len(stack)):
+                prefix.append(prefix[-1] + (stack.tile_values[j - 1] < stack.tile_values[j]))
+            self.prefix_discontinuities.append(prefix)
+        self.discontinuities = [prefix[-1] for prefix in self.prefix_discontinuities]
+        self.total_height = sum(self.heights)
+        self.total_discontinuities = sum(self.discontinuities)
+        self.sorted_heights = sorted(self.heights)
+        self.max_size = self.stacks[1].max_size
+        self.num_discards = game_model.discard_pile.num_discards
+        self.max_tiles = len(self.stacks) * self.stacks[0].max_size + game_model.discard_pile.max_discards
+
+    def largest_height_without(self, index):
+        if self.heights[index] != self.sorted_heights[-1]:
+            return self.sorted_heights[-1]
+        return self.sorted_heights[-2]
+
+    def lowest_height_without(self, index):
+        if self.heights[index] != self.sorted_heights[0]:
+            return self.sorted_heights[0]
+        return self.sorted_heights[1]
+
+
 class Move:
-    def __init__(self, game_model, pile):
+    def __init__(self, game_model, pile, summary=None):
         self.initialize_values()
-        self.game_model = deepcopy(game_model)
+        if summary is None:
+            summary = StackSummary(game_model)
         self.original_pile = pile
-        self.pile = self.game_model.get_pile(pile.pile_id)
-        self.stack_move = isinstance(self.pile, Stack)
-        original_height = 0
-        if self.stack_move:
-            original_height = len(pile)
-        self.game_model.make_move(self.pile)
+        self.pile = pile
+        self.stack_move = isinstance(pile, Stack)
+        heights = summary.heights
         if self.stack_move:
-            self.set_num_merges(original_height)
+            self.evaluate_stack_move(game_model, summary)
         else:
             self.num_merges = 0
-        self.set_num_discontinuities()
-        self.set_num_tiles()
-        self.set_score_change(game_model)
-        self.set_largest_height()
-        self.set_lowest_height()
-        self.set_average_height()
-        self.set_num_discards()
-        self.set_fill_ratio()
+            self.num_discontinuities = summary.total_discontinuities
+            self.num_tiles = summary.total_height
+            self.largest_height = summary.sorted_heights[-1]
+            self.lowest_height = min(summary.max_size, summary.sorted_heights[0])
+            self.num_discards = summary.num_discards + 1
+        self.average_height = self.num_tiles / (len(heights) - 1)
+        self.fill_ratio = self.num_tiles / summary.max_tiles
+
+    def evaluate_stack_move(self, game_model, summary):
+        index = summary.stacks.index(self.pile)
+        original_height = summary.heights[index]
+        tile_values, self.score_change = self.pile.preview_add_tile(game_model.tile_queue.peak(0))
+        new_height = len(tile_values)
+        self.set_num_merges(original_height, new_height)
+
+        # Only the tiles left of the original stack and the new top tile
+        # can form discontinuities
+        kept = new_height - 1
+        new_discontinuities = summary.prefix_discontinuities[index][kept - 1] if kept > 0 else 0
+        if kept > 0 and tile_values[kept - 1] < tile_values[kept]:
+            new_discontinuities += 1
+        self.num_discontinuities = (summary.total_discontinuities - summary.discontinuities[index]
+                                    + new_discontinuities)
+
+        self.num_tiles = summary.total_height - original_height + new_height
+        self.largest_height = max(summary.largest_height_without(index), new_height)
+        self.lowest_height = min(summary.max_size, summary.lowest_height_without(index), new_height)
+        self.num_discards = summary.num_discards
+        if new_height == 0:
+            self.num_discards = 0
 
     def initialize_values(self):
         self.num_merges = 0
@@ -76,55 +172,12 @@ class Move:
         self.fill_ratio = 0
         self.evaluation = 0
 
-    def set_num_merges(self, original_height):
-        new_height = len(self.pile)
+    def set_num_merges(self, original_height, new_height):
         if original_height != 0 and new_height == 0:
             self.num_merges = original_height
         else:
             self.num_merges = original_height + 1 - new_height
 
-    def set_num_discontinuities(self):
-        for stack in self.game_model.stacks:
-            for i in range(0, len(stack) - 1):
-                if stack.tile_values[i] < stack.tile_values[i + 1]:
-                    self.num_discontinuities += 1
-
-    def set_num_tiles(self):
-        for stack in self.game_model.stacks:
-            self.num_tiles += len(stack)
-
-    def set_score_change(self, original_game_model):
-        new_score = self.game_model.score
-        old_score = original_game_model.score
-        self.score_change = new_score - old_score
-
-    def set_largest_height(self):
-        largest_height = 0
-        for stack in self.game_model.stacks:
-            if len(stack) > largest_height:
-                largest_height = len(stack)
-        self.largest_height = largest_height
-
-    def set_lowest_height(self):
-        lowest_height = self.game_model.stacks[1].max_size
-        for stack in self.game_model.stacks:
-            if len(stack) < lowest_height:
-                lowest_height = len(stack)
-        self.lowest_height = lowest_height
-
-    def set_average_height(self):
-        total_height = 0
-        for stack in self.game_model.stacks:
-            total_height += len(stack)
-        self.average_height = total_height / (len(self.game_model.stacks) - 1)
-
-    def set_num_discards(self):
-        self.num_discards = self.game_model.discard_pile.num_discards
-
-    def set_fill_ratio(self):
-        max_tiles = len(self.game_model.stacks) * self.game_model.stacks[0].max_size + self.game_model.discard_pile.max_discards
-        self.fill_ratio = self.num_tiles / max_tiles
-
 
 class GeneticBot(User):
     def __init__(self, config_path, params):
@@ -135,22 +188,24 @@ class GeneticBot(User):
         super(GeneticBot, self).__init__(config_path, params, class_name)
         self.dna = DNA(dna_init)
         self.fitness = 0
+        self.fitness_stats = None
         self.game_model = self.game_controller.game_model
         self.id = random()
 
-    def create_move(self, pile):
+    def create_move(self, pile, summary=None):
         if pile is None:
             return None
-        return Move(self.game_model, pile)
+        return Move(self.game_model, pile, summary)
 
     def get_possible_moves(self):
         possible_moves = []
         next_tile_value = self.game_model.tile_queue.peak(0)
+        summary = StackSummary(self.game_model)
         for stack in self.game_model.stacks:
             if not stack.is_full() or stack.tile_values[-1] == next_tile_value:
-                possible_moves.append(self.create_move(stack))
+                possible_moves.append(self.create_move(stack, summary))
         if not self.game_model.discard_pile.is_full():
-            possible_moves.append(self.create_move(self.game_model.discard_pile))
+            possible_moves.append(self.create_move(self.game_model.discard_pile, summary))
         for move in possible_moves:
             move.evaluation = self.dna.evaluate(move)
         return possible_moves
@@ -165,6 +220,20 @@ class GeneticBot(User):
     def is_running(self):
         return not self.game_model.game_over()
 
-    def evaluate_fitness(self):
-        self.run()
-        self.fitness = self.game_model.score
+    def evaluate_fitness(self, seeds=None, aggregate='mean'):
+        """
+        Play one game per seed and aggregate the scores into the fitness.
+        Without seeds a single game is played on the current model.
+        """
+        if seeds is None:
+            self.run()
+            scores = [self.game_model.score]
+        else:
+            simulation_stats = SimulationRunner(self).run(seeds)
+            scores = simulation_stats.scores
+            self.user_stats = UserStats(self.user_stats.user_type)
+            self.user_stats.user_score = self.game_model.score
+            self.user_stats.moves_made = simulation_stats.moves_made
+            self.user_stats.time_taken = simulation_stats.time_taken
+        self.fitness_stats = FitnessStats(scores, aggregate)
+        self.fitness = self.fitness_stats.fitness
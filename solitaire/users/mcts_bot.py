@@ -0,0 +1,354 @@
+'''
+Bot that plans with Monte Carlo tree search, using BasicBot as the default
+policy. The search runs in rounds. Every round draws one sequence of the
+unknown tiles after the two known ones and plays every move at the root
+through that same sequence, so the root moves are compared on the same
+tiles and a lucky draw does not favour one of them. Below the root, moves
+are picked by UCB1 among a set of candidates that starts with the move of
+the default policy and widens as the node is visited more, and the leaf is
+finished with a BasicBot rollout. Since the tiles change from one round to
+the next, the tree nodes stand for sequences of moves rather than for
+positions (open loop search).
+
+A rollout is worth the points it scored, less a penalty when the game was
+lost, plus a heuristic of the free space left when it is cut off at the
+rollout depth. Since every round plays all root moves on the same tiles,
+the value of a move less the value of the default policy move is a paired
+sample. The move played is the root move with the highest mean value, but
+only if its mean gain over the default policy move is more than confidence
+standard errors above zero. Otherwise the default policy move is played,
+so the search only departs from BasicBot when the rollouts clearly say
+so.
+
+The search is spread over processes with root parallelization: every
+worker grows its own tree from the current position with its own tile
+sequences, and the values of the moves at the root are added up.
+'''
+import random
+from math import log, sqrt
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+from game.compact_state import CompactState
+from game.game_model import TileQueue
+from users.base_user import User
+from users.basic_bot import BasicBot
+
+# Rollout bots of the worker process, one per game config
+_rollout_bots = dict()
+
+
+def get_rollout_bot(game_config):
+    bot = _rollout_bots.get(game_config)
+    if bot is None:
+        bot = BasicBot(game_config, {'game_display': False})
+        _rollout_bots[game_config] = bot
+    return bot
+
+
+class SearchSettings:
+    '''
+    Settings of a search, sent to the workers along with the state.
+    '''
+    def __init__(self, params):
+        self.rollout_depth = params.get('rollout_depth', 100)
+        self.exploration = params.get('exploration', 0.5)
+        self.widening = params.get('widening', 0.5)
+        self.loss_penalty = params.get('loss_penalty', 100000)
+        self.empty_cell_value = params.get('empty_cell_value', 200)
+        self.discard_value = params.get('discard_value', 500)
+        self.confidence = params.get('confidence', 2.0)
+
+
+class SearchResult:
+    '''
+    Number of rounds and, for every root move by pile id, the total value
+    and the total squared gain over the default policy move, along with the
+    number of rollouts played to get them. Every root move is played once
+    per round, so results of several workers add up round by round.
+    '''
+    def __init__(self, rounds=0, values=None, square_gains=None, rollouts=0, policy_pile_id=None):
+        self.rounds = rounds
+        self.values = values if values is not None else dict()
+        self.square_gains = square_gains if square_gains is not None else dict()
+        self.rollouts = rollouts
+        self.policy_pile_id = policy_pile_id
+
+    def add(self, other):
+        for pile_id, value in other.values.items():
+            self.values[pile_id] = self.values.get(pile_id, 0) + value
+            self.square_gains[pile_id] = self.square_gains.get(pile_id, 0) + other.square_gains[pile_id]
+        self.rounds += other.rounds
+        self.rollouts += other.rollouts
+        self.policy_pile_id = other.policy_pile_id
+
+    def best_pile_id(self, confidence):
+        '''
+        The root move with the highest mean value if its gain over the
+        default policy move is significant, otherwise the default move.
+        '''
+        if self.rounds < 2 or self.policy_pile_id not in self.values:
+            return self.policy_pile_id
+        best_pile_id = max(self.values, key=lambda pile_id: self.values[pile_id])
+        rounds = self.rounds
+        mean_gain = (self.values[best_pile_id] - self.values[self.policy_pile_id]) / rounds
+        variance = max(0, (self.square_gains[best_pile_id] / rounds - mean_gain ** 2) * rounds / (rounds - 1))
+        if mean_gain <= confidence * sqrt(variance / rounds):
+            return self.policy_pile_id
+        return best_pile_id
+
+
+class Node:
+    __slots__ = ('children', 'visits', 'reward')
+
+    def __init__(self):
+        self.children = dict()
+        self.visits = 0
+        self.reward = 0
+
+
+class TreeSearch:
+    '''
+    A single search tree grown on the model of a BasicBot, which also plays
+    the rollouts. The model is overwritten with the root position before
+    every rollout.
+    '''
+    def __init__(self, bot, state, seed, settings):
+        self.bot = bot
+        self.game_model = bot.game_model
+        state.apply_to(self.game_model)
+        self.root_stacks = [list(stack.tile_values) for stack in self.game_model.stacks]
+        self.root_discards = self.game_model.discard_pile.num_discards
+        self.root_queue = list(self.game_model.tile_queue.tile_values)
+        self.root_score = self.game_model.score
+        self.tile_queue = TileQueue(seed)
+        self.rng = random.Random(seed)
+        self.settings = settings
+        self.max_stack_size = self.game_model.stacks[0].max_size
+        self.root = Node()
+        # Range of the rewards seen, used to bring them to [0, 1] for UCB1
+        self.min_reward = 0
+        self.max_reward = 1
+
+    def restore_root(self, round_seed):
+        '''
+        Go back to the root position, with the unknown tiles drawn from the
+        sequence of the round.
+        '''
+        game_model = self.game_model
+        for stack, tile_values in zip(game_model.stacks, self.root_stacks):
+            stack.set_tiles(tile_values)
+        game_model.discard_pile.num_discards = self.root_discards
+        self.tile_queue.tile_values = list(self.root_queue)
+        self.tile_queue.rng.seed(round_seed)
+        game_model.tile_queue = self.tile_queue
+        game_model.score = self.root_score
+
+    def candidate_piles(self):
+        '''
+        Legal piles of the current position, with the pile the default
+        policy picks first.
+        '''
+        game_model = self.game_model
+        next_tile_value = game_model.tile_queue.peak(0)
+        piles = [stack for stack in game_model.stacks
+                 if not stack.is_full() or stack.tile_values[-1] == next_tile_value]
+        if not game_model.discard_pile.is_full():
+            piles.append(game_model.discard_pile)
+        if len(piles) > 1:
+            policy_pile = self.bot.get_target_pile(None)
+            if policy_pile is not None and policy_pile in piles:
+                piles.remove(policy_pile)
+                piles.insert(0, policy_pile)
+        return piles
+
+    def select(self, node, piles):
+        '''
+        Return the pile to play from the node. Only the first piles, starting
+        with the default policy move, are considered, more of them as the
+        node is visited more. An untried one is played first, otherwise the
+        child with the highest UCB1 value.
+        '''
+        num_candidates = 1 + int(self.settings.widening * sqrt(node.visits))
+        piles = piles[:num_candidates]
+        for pile in piles:
+            if pile.pile_id not in node.children:
+                return pile
+        log_visits = log(node.visits)
+        reward_range = self.max_reward - self.min_reward
+        best_pile = None
+        best_value = None
+        for pile in piles:
+            child = node.children[pile.pile_id]
+            value = ((child.reward / child.visits - self.min_reward) / reward_range
+                     + self.settings.exploration * sqrt(log_visits / child.visits))
+            if best_value is None or value > best_value:
+                best_pile = pile
+                best_value = value
+        return best_pile
+
+    def rollout(self):
+        game_model = self.game_model
+        get_target_pile = self.bot.get_target_pile
+        for _ in range(self.settings.rollout_depth):
+            if game_model.game_over():
+                break
+            target_pile = get_target_pile(None)
+            if target_pile is None:
+                break
+            game_model.make_move(target_pile)
+
+    def evaluate(self):
+        '''
+        Value of the position reached by a rollout, relative to the root.
+        '''
+        game_model = self.game_model
+        settings = self.settings
+        value = game_model.score - self.root_score
+        if game_model.game_over():
+            return value - settings.loss_penalty
+        empty_cells = 0
+        for stack in game_model.stacks:
+            empty_cells += self.max_stack_size - len(stack)
+        discards_left = game_model.discard_pile.max_discards - game_model.discard_pile.num_discards
+        return value + empty_cells * settings.empty_cell_value + discards_left * settings.discard_value
+
+    def iterate(self, child, pile_id, round_seed):
+        '''
+        Play the root move of the given child with the tiles of the round,
+        descend the subtree of the child, expand it and roll out. Returns
+        the value of the rollout.
+        '''
+        self.restore_root(round_seed)
+        game_model = self.game_model
+        game_model.make_move(game_model.get_pile(pile_id))
+        node = child
+        path = [node]
+        expanded = False
+        while not expanded and not game_model.game_over():
+            piles = self.candidate_piles()
+            if len(piles) == 0:
+                break
+            pile = self.select(node, piles)
+            next_node = node.children.get(pile.pile_id)
+            if next_node is None:
+                next_node = Node()
+                node.children[pile.pile_id] = next_node
+                expanded = True
+            game_model.make_move(pile)
+            node = next_node
+            path.append(node)
+        self.rollout()
+        reward = self.evaluate()
+        self.min_reward = min(self.min_reward, reward)
+        self.max_reward = max(self.max_reward, reward)
+        for node in path:
+            node.visits += 1
+            node.reward += reward
+        return reward
+
+    def run(self, max_rollouts, deadline):
+        self.restore_root(0)
+        pile_ids = [pile.pile_id for pile in self.candidate_piles()]
+        policy_pile_id = pile_ids[0] if len(pile_ids) > 0 else None
+        for pile_id in pile_ids:
+            self.root.children[pile_id] = Node()
+        values = {pile_id: 0 for pile_id in pile_ids}
+        square_gains = {pile_id: 0 for pile_id in pile_ids}
+        rounds = 0
+        rollouts = 0
+        # A single legal move needs no search. Otherwise at least one round
+        # is played, then rounds go on while they fit in the budget.
+        while len(pile_ids) > 1:
+            if rounds > 0 and rollouts + len(pile_ids) > max_rollouts:
+                break
+            if rounds > 0 and deadline is not None and perf_counter() >= deadline:
+                break
+            round_seed = self.rng.getrandbits(64)
+            round_values = [self.iterate(self.root.children[pile_id], pile_id, round_seed) for pile_id in pile_ids]
+            for pile_id, value in zip(pile_ids, round_values):
+                values[pile_id] += value
+                square_gains[pile_id] += (value - round_values[0]) ** 2
+            rounds += 1
+            rollouts += len(pile_ids)
+        return SearchResult(rounds, values, square_gains, rollouts, policy_pile_id)
+
+
+def search_tree(game_config, state, seed, max_rollouts, move_time, settings):
+    '''
+    Grow one tree from the state. Runs in the worker processes, so only the
+    compact state is sent over and only the root statistics are sent back.
+    '''
+    deadline = None if move_time is None else perf_counter() + move_time
+    bot = get_rollout_bot(game_config)
+    tree_search = TreeSearch(bot, state, seed, settings)
+    return tree_search.run(max_rollouts, deadline)
+
+
+class MCTSBot(User):
+    '''
+    Monte Carlo tree search player. The params can set the rollouts per
+    move, or a move_time in seconds, the num_workers searching in parallel
+    and the settings of SearchSettings: the rollout_depth in moves, the
+    UCB1 exploration constant, the widening of the candidate moves, the
+    loss_penalty, the empty_cell_value and discard_value of the heuristic
+    and the confidence, in standard errors, a move must beat the default
+    policy move by. With more than one worker the trees are grown on a
+    process pool, which is kept until close is called.
+    '''
+    def __init__(self, config_path, params):
+        class_name = type(self).__name__
+        super(MCTSBot, self).__init__(config_path, params, class_name)
+        self.game_config = self.game_controller.game_config
+        self.game_model = self.game_controller.game_model
+        self.rollouts = params.get('rollouts', 200)
+        self.move_time = params.get('move_time')
+        self.settings = SearchSettings(params)
+        self.num_workers = params.get('num_workers', 1)
+        self.rng = random.Random(params.get('search_seed'))
+        self.executor = None
+        self.rollouts_made = 0
+        self.search_time = 0
+
+    @property
+    def rollouts_per_second(self):
+        if self.search_time == 0:
+            return 0
+        return self.rollouts_made / self.search_time
+
+    def search(self):
+        state = CompactState.from_model(self.game_model)
+        # Without a time limit the rollout budget is shared by the workers
+        max_rollouts = float('inf')
+        if self.move_time is None:
+            max_rollouts = -(-self.rollouts // self.num_workers)
+        seeds = [self.rng.getrandbits(64) for _ in range(self.num_workers)]
+        args = (max_rollouts, self.move_time, self.settings)
+        if self.num_workers == 1:
+            return search_tree(self.game_config, state, seeds[0], *args)
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.num_workers)
+        futures = [self.executor.submit(search_tree, self.game_config, state, seed, *args) for seed in seeds]
+        result = SearchResult()
+        for future in futures:
+            result.add(future.result())
+        return result
+
+    def get_target_pile(self, events):
+        if self.game_model.game_over():
+            return None
+        start_time = perf_counter()
+        result = self.search()
+        self.search_time += perf_counter() - start_time
+        self.rollouts_made += result.rollouts
+        pile_id = result.best_pile_id(self.settings.confidence)
+        if pile_id is None:
+            return None
+        return self.game_model.get_pile(pile_id)
+
+    def is_running(self):
+        return not self.game_model.game_over()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,168 @@
+'''
+Bot that searches ahead over the tile queue. The two tiles in the queue
+are known, so they are searched exactly, and every tile after them is one
+of 2 to 64 with equal probability, so those are searched as chance nodes.
+Positions are scored by the points gained along the way plus a heuristic
+of the final position.
+
+The order of the stacks does not matter to the game, so positions are
+keyed by their sorted stacks. Transpositions reached by placing tiles in a
+different order, or on stacks that look the same, are only searched once.
+'''
+from time import perf_counter
+from game.game_model import add_tile_values
+from users.base_user import User
+
+# Values an unknown tile takes, all equally likely (see TileQueue)
+UNKNOWN_TILES = tuple(pow(2, i) for i in range(1, 7))
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchBot(User):
+    '''
+    Expectimax search over the tile queue. The params can set the
+    search_depth, in tiles placed, and a search_time limit in seconds. With
+    a time limit the search is deepened one tile at a time and the move of
+    the deepest search finished in time is played.
+    '''
+    GAME_OVER_VALUE = -1e7
+    EMPTY_CELL_WEIGHT = 200
+    DISCARD_WEIGHT = 300
+    DISCONTINUITY_WEIGHT = 400
+    MAX_CACHE_SIZE = 1000000
+
+    def __init__(self, config_path, params):
+        class_name = type(self).__name__
+        super(SearchBot, self).__init__(config_path, params, class_name)
+        self.game_model = self.game_controller.game_model
+        self.search_depth = params.get('search_depth', 2)
+        self.search_time = params.get('search_time')
+        self.max_stack_size = self.game_model.stacks[0].max_size
+        self.max_discards = self.game_model.discard_pile.max_discards
+        self.cache = dict()
+        self.deadline = None
+        self.nodes_searched = 0
+
+    def heuristic(self, stacks, num_discards):
+        '''
+        Score a position by its free space and by how many tiles sit on top
+        of a smaller tile, which keeps the smaller tile from merging.
+        '''
+        empty_cells = 0
+        discontinuities = 0
+        for tile_values in stacks:
+            empty_cells += self.max_stack_size - len(tile_values)
+            for j in range(1, len(tile_values)):
+                if tile_values[j - 1] < tile_values[j]:
+                    discontinuities += 1
+        return (empty_cells * SearchBot.EMPTY_CELL_WEIGHT
+                + (self.max_discards - num_discards) * SearchBot.DISCARD_WEIGHT
+                - discontinuities * SearchBot.DISCONTINUITY_WEIGHT)
+
+    def is_game_over(self, stacks, num_discards):
+        if num_discards < self.max_discards:
+            return False
+        for tile_values in stacks:
+            if len(tile_values) < self.max_stack_size:
+                return False
+        return True
+
+    def get_children(self, stacks, num_discards, tile_value):
+        '''
+        Yield the index of the stack (None for the discard pile), the points
+        scored and the resulting position of every legal move of the tile.
+        Stacks with the same tiles lead to the same position, so only the
+        first of them is tried.
+        '''
+        tried = set()
+        for index, tile_values in enumerate(stacks):
+            if tile_values in tried:
+                continue
+            tried.add(tile_values)
+            if len(tile_values) == self.max_stack_size and tile_values[-1] != tile_value:
+                continue
+            new_tile_values, score = add_tile_values(tile_values, tile_value)
+            new_tile_values = tuple(new_tile_values)
+            new_stacks = stacks[:index] + (new_tile_values,) + stacks[index + 1:]
+            new_discards = 0 if len(new_tile_values) == 0 else num_discards
+            yield index, score, new_stacks, new_discards
+        if num_discards < self.max_discards:
+            yield None, 0, stacks, num_discards + 1
+
+    def evaluate(self, stacks, num_discards, queue, depth):
+        '''
+        Expected points from the position onward, searching depth more tiles.
+        '''
+        if self.is_game_over(stacks, num_discards):
+            return SearchBot.GAME_OVER_VALUE
+        if depth == 0:
+            return self.heuristic(stacks, num_discards)
+
+        key = (tuple(sorted(stacks)), num_discards, queue, depth)
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        if self.deadline is not None and perf_counter() > self.deadline:
+            raise SearchTimeout()
+        self.nodes_searched += 1
+
+        if len(queue) == 0:
+            value = 0
+            for tile_value in UNKNOWN_TILES:
+                value += self.evaluate(stacks, num_discards, (tile_value,), depth)
+            value /= len(UNKNOWN_TILES)
+        else:
+            value = None
+            for _, score, new_stacks, new_discards in self.get_children(stacks, num_discards, queue[0]):
+                child_value = score + self.evaluate(new_stacks, new_discards, queue[1:], depth - 1)
+                if value is None or child_value > value:
+                    value = child_value
+
+        if len(self.cache) >= SearchBot.MAX_CACHE_SIZE:
+            self.cache.clear()
+        self.cache[key] = value
+        return value
+
+    def search(self, depth):
+        '''
+        Return the index of the stack (None for the discard pile) of the best
+        move found searching depth tiles ahead.
+        '''
+        stacks = tuple(tuple(stack.tile_values) for stack in self.game_model.stacks)
+        num_discards = self.game_model.discard_pile.num_discards
+        queue = tuple(self.game_model.tile_queue.tile_values)
+        best_index = None
+        best_value = None
+        for index, score, new_stacks, new_discards in self.get_children(stacks, num_discards, queue[0]):
+            value = score + self.evaluate(new_stacks, new_discards, queue[1:], depth - 1)
+            if best_value is None or value > best_value:
+                best_index = index
+                best_value = value
+        return best_index
+
+    def get_best_move(self):
+        if self.search_time is None:
+            return self.search(self.search_depth)
+        self.deadline = perf_counter() + self.search_time
+        best_index = self.search(1)
+        try:
+            for depth in range(2, self.search_depth + 1):
+                best_index = self.search(depth)
+        except SearchTimeout:
+            pass
+        self.deadline = None
+        return best_index
+
+    def get_target_pile(self, events):
+        if self.game_model.game_over():
+            return None
+        index = self.get_best_move()
+        if index is None:
+            return self.game_model.discard_pile
+        return self.game_model.stacks[index]
+
+    def is_running(self):
+        return not self.game_model.game_over()
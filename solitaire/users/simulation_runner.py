@@ -0,0 +1,85 @@
+'''
+Plays games with a bot as fast as possible. The interactive loop of
+User.run goes through the GameController, which validates every move, looks
+the pile up again and sleeps for the refresh time. The SimulationRunner
+skips all of that and applies the pile chosen by the bot straight to the
+model, resetting the same model in place between games.
+'''
+import random
+from time import perf_counter
+from game.game_record import GameRecord
+
+
+class SimulationStats:
+    def __init__(self, scores, moves, time_taken):
+        self.scores = scores
+        self.moves = moves
+        self.time_taken = time_taken
+        self.num_games = len(scores)
+        self.moves_made = sum(moves)
+        self.games_per_second = 0
+        self.moves_per_second = 0
+        if time_taken > 0:
+            self.games_per_second = self.num_games / time_taken
+            self.moves_per_second = self.moves_made / time_taken
+
+    def __str__(self):
+        return '{} games in {:.2f}s: {:.1f} games/s, {:.0f} moves/s'.format(
+            self.num_games, self.time_taken, self.games_per_second, self.moves_per_second)
+
+
+class SimulationRunner:
+    '''
+    Runs headless games for a bot. The bot must choose its moves from the
+    model of its own game controller and must not need pygame events, so
+    this works for the bots but not for the Human user. With a GameLog every
+    game is recorded to it.
+    '''
+    def __init__(self, user, game_log=None):
+        self.user = user
+        self.game_model = user.game_controller.game_model
+        self.game_log = game_log
+
+    def play_game(self, record=None):
+        '''
+        Play the current game of the model to the end, adding the moves to
+        the record if one is given. Returns the number of moves made.
+        '''
+        game_model = self.game_model
+        get_target_pile = self.user.get_target_pile
+        moves_made = 0
+        while not game_model.game_over():
+            target_pile = get_target_pile(None)
+            if target_pile is None:
+                break
+            game_model.make_move(target_pile)
+            if record is not None:
+                record.add_move(target_pile)
+            moves_made += 1
+        return moves_made
+
+    def run(self, seeds):
+        '''
+        Play one game per tile seed, back to back on the same model. A seed
+        of None plays a game from the global random generator, or when
+        recording, from a seed drawn from it so the game can be replayed.
+        '''
+        scores = []
+        moves = []
+        records = []
+        start_time = perf_counter()
+        for seed in seeds:
+            record = None
+            if self.game_log is not None:
+                if seed is None:
+                    seed = random.getrandbits(64)
+                record = GameRecord(seed)
+            self.game_model.reset(seed)
+            moves.append(self.play_game(record))
+            scores.append(self.game_model.score)
+            if record is not None:
+                record.score = self.game_model.score
+                records.append(record)
+        if self.game_log is not None:
+            self.game_log.append(records)
+        return SimulationStats(scores, moves, perf_counter() - start_time)
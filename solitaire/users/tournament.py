@@ -0,0 +1,204 @@
+'''
+Plays several bots over the same seeded games and compares them. Every bot
+sees the same tile sequences, so score differences come from the bots and
+not from the tiles. Games are spread over a process pool in chunks of
+seeds, and the results can be checked against a stored baseline to catch
+drops in score or speed.
+'''
+import json
+from math import ceil
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+from game.game_config import GameConfig
+from users.genetic_bot import FitnessStats
+from users.simulation_runner import SimulationRunner
+
+
+class Entrant:
+    '''
+    A bot in the tournament: a name, a User subclass and its params. The
+    class and the params are sent to the workers, so they must pickle.
+    '''
+    def __init__(self, name, user_class, params=None):
+        self.name = name
+        self.user_class = user_class
+        self.params = dict() if params is None else dict(params)
+        self.params['game_display'] = False
+
+
+def play_games(game_config, user_class, params, seeds):
+    '''
+    Play one headless game per seed with a new bot. Runs in the worker
+    processes.
+    '''
+    user = user_class(game_config, params)
+    stats = SimulationRunner(user).run(seeds)
+    if hasattr(user, 'close'):
+        user.close()
+    return stats
+
+
+def measure_speed(game_config, entrant, seeds, min_time, repeats=5):
+    '''
+    Time the bot alone in this process, without other bots competing for
+    the cores. The bot plays the seeds for repeats rounds of min_time /
+    repeats seconds each, starting the next game whenever one ends and
+    stopping mid game when the round is over, so slow bots are not held
+    to whole games. Returns the moves/s of the fastest round, as timeit
+    does, since a slower round only measures interference from the rest
+    of the machine.
+    '''
+    user = entrant.user_class(game_config, entrant.params)
+    game_model = user.game_controller.game_model
+    get_target_pile = user.get_target_pile
+    round_time = min_time / repeats
+    seed_index = 0
+    game_model.reset(seeds[seed_index])
+    fastest = 0
+    for _ in range(repeats):
+        moves_made = 0
+        start_time = perf_counter()
+        while perf_counter() - start_time < round_time:
+            target_pile = None
+            if not game_model.game_over():
+                target_pile = get_target_pile(None)
+            if target_pile is None:
+                seed_index = (seed_index + 1) % len(seeds)
+                game_model.reset(seeds[seed_index])
+                continue
+            game_model.make_move(target_pile)
+            moves_made += 1
+        fastest = max(fastest, moves_made / (perf_counter() - start_time))
+    if hasattr(user, 'close'):
+        user.close()
+    return fastest
+
+
+class BotResult:
+    '''
+    Scores of a bot over the tournament and its speed, timed apart from the
+    tournament games by measure_speed. The games/s follow from the moves/s
+    and the mean length of the tournament games.
+    '''
+    def __init__(self, name, chunk_stats, moves_per_second):
+        self.name = name
+        self.scores = [score for stats in chunk_stats for score in stats.scores]
+        self.moves_made = sum(stats.moves_made for stats in chunk_stats)
+        # Time spent playing, added up over the workers
+        self.time_taken = sum(stats.time_taken for stats in chunk_stats)
+        self.fitness_stats = FitnessStats(self.scores)
+        self.mean = self.fitness_stats.mean
+        self.confidence_interval = self.fitness_stats.confidence_interval
+        self.moves_per_second = moves_per_second
+        self.games_per_second = moves_per_second * len(self.scores) / max(1, self.moves_made)
+
+    def distribution(self):
+        quantile = FitnessStats.quantile
+        return {
+            'min': min(self.scores),
+            'q0.25': quantile(self.scores, 0.25),
+            'median': quantile(self.scores, 0.5),
+            'q0.75': quantile(self.scores, 0.75),
+            'max': max(self.scores),
+        }
+
+    def to_dict(self):
+        return {
+            'games': len(self.scores),
+            'mean': self.mean,
+            'confidence_interval': self.confidence_interval,
+            'distribution': self.distribution(),
+            'moves_made': self.moves_made,
+            'games_per_second': self.games_per_second,
+            'moves_per_second': self.moves_per_second,
+        }
+
+    def __str__(self):
+        distribution = self.distribution()
+        return ('{}: {:.1f} +/- {:.1f} (min {} median {:.0f} max {}) '
+                '{:.1f} games/s {:.0f} moves/s').format(
+            self.name, self.mean, self.confidence_interval, distribution['min'],
+            distribution['median'], distribution['max'], self.games_per_second, self.moves_per_second)
+
+
+class Tournament:
+    '''
+    Plays every entrant over the same seeds. With more than one worker the
+    seeds are cut into chunks of chunk_size games, and every chunk of every
+    entrant is a task on the process pool. By default the seeds are split
+    evenly over the workers, so even a short tournament keeps every worker
+    busy with every bot. Once the pool is done, every bot is timed alone
+    for speed_time seconds.
+    '''
+    def __init__(self, game_config, entrants, num_workers=1, chunk_size=None, speed_time=2.0):
+        self.game_config = GameConfig.get(game_config)
+        self.entrants = entrants
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.speed_time = speed_time
+
+    def run(self, seeds):
+        seeds = list(seeds)
+        chunk_size = self.chunk_size
+        if chunk_size is None:
+            chunk_size = max(1, ceil(len(seeds) / self.num_workers))
+        chunks = [seeds[i:i + chunk_size] for i in range(0, len(seeds), chunk_size)]
+        if self.num_workers > 1:
+            with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+                futures = [[executor.submit(play_games, self.game_config, entrant.user_class,
+                                            entrant.params, chunk)
+                            for chunk in chunks]
+                           for entrant in self.entrants]
+                chunk_stats = [[future.result() for future in entrant_futures] for entrant_futures in futures]
+        else:
+            chunk_stats = [[play_games(self.game_config, entrant.user_class, entrant.params, chunk)
+                            for chunk in chunks]
+                           for entrant in self.entrants]
+        results = []
+        for entrant, entrant_stats in zip(self.entrants, chunk_stats):
+            moves_per_second = measure_speed(self.game_config, entrant, seeds, self.speed_time)
+            results.append(BotResult(entrant.name, entrant_stats, moves_per_second))
+        return results
+
+
+def save_baseline(results, path):
+    with open(path, 'w') as baseline_file:
+        json.dump({result.name: result.to_dict() for result in results}, baseline_file, indent=2)
+
+
+def check_baseline(results, path, score_threshold=0.05, speed_threshold=None):
+    '''
+    Compare the results with the baseline stored at the path. Returns a
+    message for every bot whose mean score or moves/s dropped by more than
+    the threshold fraction of its baseline. Bots missing from the baseline
+    are not checked. The speed depends on the machine and its load, so it
+    is only checked when a speed_threshold is given.
+    '''
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)
+    failures = []
+    for result in results:
+        if result.name not in baseline:
+            continue
+        expected = baseline[result.name]
+        if result.mean < expected['mean'] * (1 - score_threshold):
+            failures.append('{} mean score {:.1f} is below the baseline {:.1f}'.format(
+                result.name, result.mean, expected['mean']))
+        if speed_threshold is not None and \
+                result.moves_per_second < expected['moves_per_second'] * (1 - speed_threshold):
+            failures.append('{} speed {:.0f} moves/s is below the baseline {:.0f} moves/s'.format(
+                result.name, result.moves_per_second, expected['moves_per_second']))
+    return failures
+
+
+def run_tournament(game_config, entrants, seeds, num_workers=1, chunk_size=None):
+    '''
+    Play the tournament and print a line per bot along with the wall time.
+    '''
+    start_time = perf_counter()
+    results = Tournament(game_config, entrants, num_workers, chunk_size).run(seeds)
+    wall_time = perf_counter() - start_time
+    for result in results:
+        print(result)
+    print('{} games per bot in {:.2f}s'.format(len(results[0].scores), wall_time))
+    return results